@@ -1,17 +1,35 @@
 """Support Peewee ORM for Muffin framework."""
 
-from contextlib import asynccontextmanager
+from contextlib import AsyncExitStack, asynccontextmanager, suppress
 from copy import copy
-from typing import TYPE_CHECKING, Callable, ClassVar, Literal, Self, overload
+from functools import partial
+from time import time
+from typing import (
+    TYPE_CHECKING,
+    Any,
+    Callable,
+    ClassVar,
+    Literal,
+    Self,
+    TypeVar,
+    get_args,
+    overload,
+)
+from urllib.parse import urlsplit
 
 import peewee as pw
 from aio_databases.database import ConnectionContext, TransactionContext
+from http_router import RouterError
+from muffin import Response, ResponseError
 from muffin.plugins import BasePlugin, PluginNotInstalledError
 from peewee_aio.fields import JSONGenericField
-from peewee_aio.manager import Manager
 from peewee_aio.model import AIOModel
 from peewee_migrate import Router
 
+from .bulk import bulk_dump, bulk_load, insert_many_batched
+from .bus import InvalidationBus, PostgresTransport, SocketTransport, Transport
+from .cache import CacheBackend, LRUCacheBackend, QueryCache
+from .compiled import CompiledQuery, SQLCache
 from .fields import (
     Choices,
     IntEnumField,
@@ -19,29 +37,74 @@ from .fields import (
     JSONLikeField,
     JSONPGField,
     JSONSQLiteField,
+    JSONStructAsyncPGField,
+    JSONStructLikeField,
+    JSONStructPGField,
+    JSONStructSQLiteField,
     StrEnumField,
     URLField,
 )
+from .identity import IdentityMap, identity_scope
+from .instrumentation import (
+    NPlusOneDetector,
+    NPlusOneError,
+    QueryBudgetError,
+    QueryRecord,
+    QueryStats,
+    SlowQueryLog,
+    collect_stats,
+    current_stats,
+)
+from .json_codec import JSONCodec, get_json_codec, init_asyncpg_json
+from .loader import RelationLoader, current_loader, loader_scope
+from .manager import LazyContext, Manager
 from .migrations import setup_migrations
-from .types import TV
+from .pagination import Page, paginate
+from .responses import ResponseQuery
+from .types import TV, TPolicy
 
 if TYPE_CHECKING:
-    from muffin import Application
+    from collections.abc import AsyncIterator, Sequence
+    from contextlib import AbstractContextManager
+
+    from muffin import Application, Request
     from peewee_aio.types import TVModel
 
+    from .bulk import TRows
+    from .responses import TStreamFormat
+
 __all__ = (
+    "CacheBackend",
     "Choices",
     "EnumField",
     "IntEnumField",
     "JSONLikeField",
     "JSONPGField",
+    "NPlusOneError",
+    "Page",
     "Plugin",
+    "QueryBudgetError",
+    "QueryRecord",
+    "QueryStats",
+    "ResponseQuery",
+    "SocketTransport",
     "StrEnumField",
+    "Transport",
     "URLField",
 )
 
 EnumField = StrEnumField
 
+TVHook = TypeVar("TVHook", bound=Callable)
+
+POLICIES: tuple[TPolicy, ...] = get_args(TPolicy)
+SAFE_METHODS = ("GET", "HEAD", "OPTIONS")
+POOL_MIN_SIZE_OPTIONS = {
+    "asyncpg+pool": "min_size",
+    "aiopg+pool": "minsize",
+    "aiomysql+pool": "minsize",
+}
+
 
 class Plugin(BasePlugin):
     """Muffin Peewee Plugin."""
@@ -52,9 +115,71 @@ class Plugin(BasePlugin):
         "connection": "aiosqlite:///db.sqlite",
         "connection_params": {},
         "replicas": None,
+        "replicas_weights": None,
+        # Check replicas every N seconds and exclude unavailable/lagging ones (0 to disable)
+        "replicas_health_interval": 0.0,
+        "replicas_max_lag": None,
+        # Consider replicas unavailable if their checks take longer than N seconds
+        "replicas_health_timeout": 5.0,
+        # Keep the minimum number of connections in a pool (for pool backends)
+        "pool_min_size": None,
+        # Pre-open and validate the number of connections on startup
+        "warmup_connections": 0,
+        "warmup_query": "SELECT 1",
+        # Wait for active connections for the given seconds on shutdown (0 to disable)
+        "drain_timeout": 0.0,
         # Manage connections automatically
         "auto_connection": True,
         "auto_transaction": True,
+        # Acquire connections (and start transactions) on the first query only
+        "lazy_connection": False,
+        # Connection policies by HTTP methods (none, connection, transaction, replica)
+        "policies": {},
+        # Route safe HTTP methods (GET, HEAD, OPTIONS) to replicas
+        "auto_replicas": False,
+        # Pin a client to the primary for the given seconds after a write (0 to disable)
+        "replicas_sticky": 0,
+        "replicas_sticky_cookie": "peewee-primary",
+        # Collect queries stats per request (send them in Server-Timing header)
+        "query_stats": False,
+        "query_stats_header": True,
+        # Don't pass query params to the query hooks
+        "query_redact_params": False,
+        # Detect queries of the same shape repeated in a request more than N times (0 to disable)
+        "nplusone_threshold": 0,
+        # Raise NPlusOneError instead of logging a warning
+        "nplusone_raise": False,
+        # Log queries slower than N seconds (0 to disable)
+        "slow_query_threshold": 0.0,
+        # Capture the plans of slow queries (EXPLAIN) in background
+        "slow_query_explain": False,
+        # Sample rate of the slow queries to get with EXPLAIN ANALYZE (selects only)
+        "slow_query_analyze_rate": 0.0,
+        # Maximum number of queries and total queries time (seconds) per request (0 to disable)
+        "query_budget_queries": 0,
+        "query_budget_duration": 0.0,
+        # Raise QueryBudgetError instead of logging a warning and adding a response header
+        "query_budget_strict": False,
+        # JSON codec for JSON fields: auto (orjson, msgspec or stdlib), orjson, msgspec, json
+        "json_codec": "auto",
+        # Decode JSON fields on the first access (SQLite and text columns)
+        "json_lazy": False,
+        # Return loaded instances for lookups by primary keys in a request
+        "identity_map": False,
+        # Batch lookups by primary keys and relations made concurrently in a request
+        "relation_loader": False,
+        # Queries results cache (see Plugin.cached): size of the in-process cache, default TTL
+        # in seconds and a shared cache backend (an instance of CacheBackend)
+        "query_cache_size": 1024,
+        "query_cache_ttl": 60.0,
+        "query_cache_backend": None,
+        # Publish tables changes to other processes to invalidate their caches:
+        # "postgres" (LISTEN/NOTIFY) or an instance of Transport
+        "invalidation_transport": None,
+        # Funnel SQLite writes through one connection (a queue) and reads through a pool of
+        # the given number of reader connections (aiosqlite, safe HTTP methods use the readers)
+        "sqlite_writer": False,
+        "sqlite_readers": 4,
         # Setup migration engine
         "migrations_enabled": True,
         "migrations_path": "migrations",
@@ -63,10 +188,24 @@ class Plugin(BasePlugin):
     }
 
     router: Router
+    method_policies: dict[str, TPolicy]
+    default_budget: tuple[int, float]
+    json_codec: JSONCodec
     manager: Manager = Manager(
         "dummy://localhost",
     )  # Dummy manager for support registration
 
+    def __init__(self, *args, **kwargs):
+        """Initialize the plugin."""
+        self.route_policies: dict[Callable, TPolicy] = {}
+        self.route_budgets: dict[Callable, tuple[int, float]] = {}
+        self.sql_cache = SQLCache()
+        self.query_hooks: list[Callable[[QueryRecord], Any]] = []
+        self.stats_hooks: list[Callable[[Request, QueryStats], Any]] = []
+        self.invalidation_hooks: list[Callable[[set[str]], Any]] = []
+        self.slow_query_log: SlowQueryLog | None = None
+        super().__init__(*args, **kwargs)
+
     def setup(self, app: "Application", **options):
         """Init the plugin."""
         super().setup(app, **options)
@@ -74,23 +213,121 @@ class Plugin(BasePlugin):
         # Init manager and rebind models
         params = dict(self.cfg.connection_params)
         params.setdefault("replicas", self.cfg.replicas)
+        params.setdefault("replicas_weights", self.cfg.replicas_weights)
+        params.setdefault("replicas_max_lag", self.cfg.replicas_max_lag)
+        params.setdefault("replicas_health_timeout", self.cfg.replicas_health_timeout)
+        params.setdefault("sqlite_writer", self.cfg.sqlite_writer)
+        params.setdefault("sqlite_readers", self.cfg.sqlite_readers)
+        if self.cfg.pool_min_size is not None:
+            scheme = urlsplit(self.cfg.connection).scheme
+            if scheme in POOL_MIN_SIZE_OPTIONS:
+                params.setdefault(POOL_MIN_SIZE_OPTIONS[scheme], self.cfg.pool_min_size)
+            else:
+                app.logger.warning("Backend doesn't support connection pools: %s", scheme)
+
         manager = Manager(self.cfg.connection, **params)
         for model in list(self.manager):
             manager.register(model)
         self.manager = manager
-
+        self.sql_cache.clear()
+
+        # Setup query hooks
+        manager.query_hooks = self.query_hooks
+        manager.redact_params = self.cfg.query_redact_params
+        self.default_budget = (self.cfg.query_budget_queries, self.cfg.query_budget_duration)
+        if self.cfg.query_stats or any(self.default_budget):
+            self.setup_stats()
+
+        if self.cfg.nplusone_threshold:
+            self.query_hooks.append(
+                NPlusOneDetector(
+                    self.cfg.nplusone_threshold, app.logger, raise_error=self.cfg.nplusone_raise
+                )
+            )
+
+        if self.cfg.slow_query_threshold:
+            self.slow_query_log = SlowQueryLog(
+                manager,
+                self.cfg.slow_query_threshold,
+                app.logger,
+                explain=self.cfg.slow_query_explain,
+                analyze_rate=self.cfg.slow_query_analyze_rate,
+            )
+            self.query_hooks.append(self.slow_query_log)
+
+        self.setup_json_codec()
+        self.setup_invalidation_bus()
         setup_migrations(self, app, manager)
+        self.setup_policies()
 
         if self.cfg.auto_connection:
             app.middleware(self.get_middleware(), insert_first=True)
 
+    def setup_invalidation_bus(self):
+        """Setup the bus to publish tables changes to other processes."""
+        transport = self.cfg.invalidation_transport
+        if not transport:
+            return
+
+        if transport == "postgres":
+            transport = PostgresTransport(self.manager)
+
+        bus = self.manager.bus = InvalidationBus(self.manager, transport, self.app.logger)
+        bus.handlers = self.invalidation_hooks
+
+    def setup_json_codec(self):
+        """Select the JSON codec and use it for asyncpg connections with JSON support."""
+        self.json_codec = codec = get_json_codec(self.cfg.json_codec)
+        manager = self.manager
+        for backend in (manager.backend, *manager.replica_backends):
+            if getattr(backend.init, "__qualname__", None) == "asyncpg_init_json":
+                backend.init = partial(init_asyncpg_json, codec)
+
+    def setup_stats(self):
+        """Collect queries stats per request."""
+        if collect_stats not in self.query_hooks:
+            self.query_hooks.insert(0, collect_stats)
+
+    def setup_policies(self):
+        """Prepare connection policies by HTTP methods."""
+        self.method_policies = {}
+        for method, policy in self.cfg.policies.items():
+            if policy not in POLICIES:
+                raise ValueError(f"Invalid connection policy: {policy!r}")
+            self.method_policies[method.upper()] = policy
+
+        if self.cfg.auto_replicas or self.cfg.sqlite_writer:
+            for method in SAFE_METHODS:
+                self.method_policies.setdefault(method, "replica")
+
     async def startup(self):
         """Connect to the database (initialize a pool and etc)."""
         await self.manager.connect()
+        if self.cfg.warmup_connections:
+            await self.manager.warmup(self.cfg.warmup_connections, self.cfg.warmup_query)
+
+        if self.cfg.replicas_health_interval:
+            self.manager.balancer.start(self.cfg.replicas_health_interval)
+
+        if self.manager.bus is not None:
+            await self.manager.bus.start()
 
     async def shutdown(self):
         """Disconnect from the database (close a pool and etc.)."""
-        await self.manager.disconnect()
+        manager = self.manager
+        await manager.balancer.stop()
+        if self.slow_query_log:
+            await self.slow_query_log.stop()
+
+        if self.cfg.drain_timeout:
+            closed = await manager.drain(self.cfg.drain_timeout)
+            if closed:
+                self.app.logger.warning("Database drain: %d connections were force-closed", closed)
+
+        if manager.bus is not None:
+            await manager.bus.stop()
+
+        await manager.disconnect()
 
     async def __aenter__(self) -> Self:
         """Connect the database."""
@@ -114,6 +351,9 @@ class Plugin(BasePlugin):
     def replica(self, *params, **opts) -> ConnectionContext:
         return self.manager.replica(*params, **opts)
 
+    def lazy_connection(self, *, transaction: bool = False, replica: bool = False) -> LazyContext:
+        return self.manager.lazy_connection(transaction=transaction, replica=replica)
+
     async def create_tables(self, *models_cls: type[pw.Model]):
         """Create SQL tables."""
         await self.manager.create_tables(*(models_cls or self.manager.models))
@@ -122,20 +362,343 @@ class Plugin(BasePlugin):
         """Drop SQL tables."""
         await self.manager.drop_tables(*(models_cls or self.manager.models))
 
-    def get_middleware(self) -> Callable:
-        """Generate a middleware to manage connection/transaction."""
+    async def bulk_load(
+        self,
+        model_cls: type[pw.Model],
+        rows: "TRows",
+        *,
+        fields: "Sequence[pw.Field] | None" = None,
+        batch_size: int = 1000,
+    ) -> int:
+        """Insert rows (dicts, tuples or model instances) into the model's table.
+
+        Use COPY on asyncpg and multi-row inserts otherwise. Return the number of rows.
+        """
+        return await bulk_load(self.manager, model_cls, rows, fields=fields, batch_size=batch_size)
+
+    async def insert_many_batched(  # noqa: PLR0913
+        self,
+        model_cls: type[pw.Model],
+        rows: "TRows",
+        *,
+        fields: "Sequence[pw.Field] | None" = None,
+        batch_size: int | None = None,
+        on_conflict: "Literal['ignore', 'replace'] | dict[str, Any] | None" = None,
+        transaction: Literal["all", "batch"] | None = "all",
+    ) -> int:
+        """Insert rows (dicts, tuples or model instances) with multi-row inserts in batches.
+
+        The batches are sized by the database's parameters limit if batch_size is not set.
+        Return the number of processed rows.
+        """
+        return await insert_many_batched(
+            self.manager,
+            model_cls,
+            rows,
+            fields=fields,
+            batch_size=batch_size,
+            on_conflict=on_conflict,
+            transaction=transaction,
+        )
+
+    def bulk_dump(self, query: pw.Query, *, batch_size: int = 1000) -> "AsyncIterator":
+        """Stream the query's results with bounded memory (server-side cursor on PostgreSQL)."""
+        return bulk_dump(self.manager, query, batch_size=batch_size)
+
+    def identity_map(self) -> "AbstractContextManager[IdentityMap]":
+        """Return loaded instances for lookups by primary keys in the context."""
+        return identity_scope()
+
+    def relation_loader(self) -> "AbstractContextManager[RelationLoader]":
+        """Batch lookups by primary keys and relations made concurrently in the context."""
+        return loader_scope(self.manager)
+
+    async def load(self, field: pw.Field, value: Any) -> Any:
+        """Get an instance by the unique field's value (batched by the current loader)."""
+        loader = current_loader.get()
+        if loader is None:
+            return await self.manager.get_or_none(field.model, field == value)
+
+        return await loader.load(field, value)
+
+    async def load_many(self, field: pw.Field, value: Any) -> list:
+        """Get instances with the field's value (reverse relations, batched by the loader)."""
+        loader = current_loader.get()
+        if loader is None:
+            return await self.manager.fetchall(field.model.select().where(field == value))
+
+        return await loader.load(field, value, many=True)
+
+    async def cached(self, query: pw.SelectBase, *, ttl: float | None = None) -> list:
+        """Get the query's results from the cache (keyed by the query's SQL and parameters).
+
+        The results are invalidated when the manager changes any table the query reads.
+        """
+        cache = self.manager.query_cache
+        if cache is None:
+            cfg = self.cfg
+            backend = cfg.query_cache_backend or LRUCacheBackend(cfg.query_cache_size)
+            cache = self.manager.query_cache = QueryCache(
+                self.manager, backend, ttl=cfg.query_cache_ttl
+            )
+
+        return await cache.get(query, ttl)
+
+    def compiled(self, builder: Callable[..., pw.Query]) -> CompiledQuery:
+        """Compile the query which is built by the function once and cache the SQL.
+
+        The function gets placeholders as the parameters and returns a query.
+        """
+        return CompiledQuery(builder, self)
+
+    async def paginate(
+        self,
+        query: pw.ModelSelect,
+        *,
+        order_by: "Sequence[Any]",
+        after: str | None = None,
+        before: str | None = None,
+        limit: int = 20,
+    ) -> Page:
+        """Get a page of the query's results by keyset pagination with opaque cursors."""
+        return await paginate(
+            self.manager, query, order_by=order_by, after=after, before=before, limit=limit
+        )
+
+    def stream(
+        self,
+        query: pw.SelectBase,
+        *,
+        format: "TStreamFormat" = "ndjson",  # noqa: A002
+        batch_size: int = 1000,
+        **kwargs,
+    ) -> ResponseQuery:
+        """Get a response which streams the query's rows as NDJSON, a JSON array or CSV.
+
+        The response reads from a replica if the current connection is read-only.
+        """
+        kwargs.setdefault("dumps", self.json_codec.dumps)
+        conn = self.manager.current_conn
+        kwargs.setdefault("replica", conn is not None and conn.read_only)
+        return ResponseQuery(self.manager, query, format=format, batch_size=batch_size, **kwargs)
+
+    def on_query(self, fn: TVHook) -> TVHook:
+        """Register a hook which is called for every executed query."""
+        self.query_hooks.append(fn)
+        return fn
+
+    def on_invalidate(self, fn: TVHook) -> TVHook:
+        """Register a hook which is called with the tables changed by other processes."""
+        self.invalidation_hooks.append(fn)
+        return fn
+
+    def on_stats(self, fn: TVHook) -> TVHook:
+        """Register a hook which is called with a request and its queries stats."""
+        self.stats_hooks.append(fn)
+        return fn
 
-        if self.cfg.auto_transaction:
+    @property
+    def query_stats(self) -> QueryStats | None:
+        """Get queries stats for the current request."""
+        return current_stats.get()
 
-            async def middleware(handler, request, receive, send):
-                async with self.connection(), self.transaction():
-                    return await handler(request, receive, send)
+    def policy(self, policy: TPolicy) -> Callable[[TV], TV]:
+        """Set a connection policy for the decorated route handler."""
+        if policy not in POLICIES:
+            raise ValueError(f"Invalid connection policy: {policy!r}")
+
+        def decorator(handler: TV) -> TV:
+            self.route_policies[handler] = policy  # type: ignore[index]
+            return handler
+
+        return decorator
+
+    def query_budget(self, queries: int = 0, duration: float = 0.0) -> Callable[[TV], TV]:
+        """Set a query budget for the decorated route handler (0 to disable a limit)."""
+        self.setup_stats()
+
+        def decorator(handler: TV) -> TV:
+            self.route_budgets[handler] = (queries, duration)  # type: ignore[index]
+            return handler
+
+        return decorator
+
+    def get_handler(self, request: "Request") -> Callable | None:
+        """Find a route handler for the given request (once per request)."""
+        scope = request.scope
+        if "peewee.handler" in scope:
+            return scope["peewee.handler"]
+
+        handler = None
+        with suppress(RouterError):
+            match = self.app.router(f"{scope.get('root_path', '')}{scope['path']}", request.method)
+            target = match.target
+            handler = target.func if isinstance(target, partial) else target
+
+        scope["peewee.handler"] = handler
+        return handler
+
+    def get_policy(self, request: "Request") -> TPolicy:
+        """Get a connection policy for the given request."""
+        policy = self.method_policies.get(request.method) or (
+            "transaction" if self.cfg.auto_transaction else "connection"
+        )
+
+        if self.route_policies:
+            policy = self.route_policies.get(self.get_handler(request), policy)  # type: ignore[arg-type]
+
+        if policy == "replica" and (not self.manager.replica_backends or self.is_sticky(request)):
+            return "connection"
+
+        return policy
+
+    def is_sticky(self, request: "Request") -> bool:
+        """Check if the client is pinned to the primary after a recent write."""
+        if not self.cfg.replicas_sticky:
+            return False
+
+        with suppress(ValueError):
+            return float(request.cookies.get(self.cfg.replicas_sticky_cookie, 0)) > time()
+
+        return False
+
+    def get_budget(self, request: "Request") -> tuple[int, float]:
+        """Get a query budget for the given request."""
+        if self.route_budgets:
+            return self.route_budgets.get(self.get_handler(request), self.default_budget)  # type: ignore[arg-type]
+
+        return self.default_budget
+
+    def check_budget(self, stats: QueryStats, budget: tuple[int, float], response: Any):
+        """Check the request's queries stats by the given budget."""
+        queries, duration = budget
+        exceeded = []
+        if queries and stats.count > queries:
+            exceeded.append(f"queries={stats.count}/{queries}")
+
+        if duration and stats.duration > duration:
+            exceeded.append(f"duration={stats.duration * 1000:.2f}/{duration * 1000:.2f}ms")
+
+        if not exceeded:
+            return
+
+        msg = f"Query budget exceeded by {stats.route}: {', '.join(exceeded)}"
+        if self.cfg.query_budget_strict:
+            raise QueryBudgetError(msg)
+
+        self.app.logger.warning(msg)
+        if isinstance(response, Response):
+            response.headers["x-query-budget-exceeded"] = ", ".join(exceeded)
+
+    def check_strict_budget(self, request: "Request", response: Any):
+        """Check the query budget in strict mode (before the request's transaction is committed)."""
+        stats = current_stats.get()
+        if stats is not None and self.cfg.query_budget_strict:
+            self.check_budget(stats, self.get_budget(request), response)
+
+    def run_stats_hooks(self, request: "Request", stats: QueryStats):
+        """Pass the request's queries stats to the stats hooks."""
+        for hook in self.stats_hooks:
+            hook(request, stats)
 
-        else:
+    def add_stats_header(self, stats: QueryStats, response: Any):
+        """Send the queries stats in Server-Timing header."""
+        if isinstance(response, Response):
+            response.headers.add(
+                "server-timing",
+                f'db;dur={stats.duration * 1000:.2f};desc="{stats.count} queries"',
+            )
+
+    def pin_primary(self, response: Any):
+        """Pin the client to the primary with a cookie."""
+        if isinstance(response, Response):
+            sticky, cookie = self.cfg.replicas_sticky, self.cfg.replicas_sticky_cookie
+            response.cookies[cookie] = str(int(time() + sticky))
+            response.cookies[cookie]["max-age"] = sticky
+            response.cookies[cookie]["path"] = "/"
+
+    def policy_context(self, policy: TPolicy) -> Any:
+        """Get a connection context for the given policy."""
+        if self.cfg.lazy_connection:
+            return self.lazy_connection(
+                transaction=policy == "transaction", replica=policy == "replica"
+            )
+
+        if policy == "replica":
+            return self.replica()
+
+        if policy == "transaction":
+            return self.transaction(create=True)
+
+        return self.connection()
+
+    async def call_handler(self, policy: TPolicy, handler, request, receive, send) -> Any:
+        """Call the handler in a connection context for the given policy."""
+        async with AsyncExitStack() as stack:
+            await stack.enter_async_context(self.policy_context(policy))
+            if self.cfg.identity_map:
+                stack.enter_context(identity_scope())
+
+            if self.cfg.relation_loader:
+                stack.enter_context(loader_scope(self.manager))
+
+            response = await handler(request, receive, send)
+            self.check_strict_budget(request, response)
+
+        return response
 
-            async def middleware(handler, request, receive, send):
-                async with self.connection():
-                    return await handler(request, receive, send)
+    def get_middleware(self) -> Callable:
+        """Generate a middleware to manage connection/transaction."""
+        sticky = self.cfg.replicas_sticky
+        query_stats = self.cfg.query_stats
+        query_stats_header = query_stats and self.cfg.query_stats_header
+        strict = self.cfg.query_budget_strict
+        # Scope queries by requests
+        scoped = query_stats or self.cfg.nplusone_threshold or self.cfg.slow_query_threshold
+        get_policy = self.get_policy
+        get_budget = self.get_budget
+        call_handler = self.call_handler
+
+        async def process(handler, request, receive, send):
+            policy = get_policy(request)
+            if policy == "none":
+                response = await handler(request, receive, send)
+                self.check_strict_budget(request, response)
+                return response
+
+            response = await call_handler(policy, handler, request, receive, send)
+
+            # Pin the client to the primary after a write
+            if sticky and policy != "replica" and request.method not in SAFE_METHODS:
+                self.pin_primary(response)
+
+            return response
+
+        async def middleware(handler, request, receive, send):
+            if self.manager.draining:
+                raise ResponseError.SERVICE_UNAVAILABLE()
+
+            budget = get_budget(request)
+            if not (scoped or any(budget)):
+                return await process(handler, request, receive, send)
+
+            stats = QueryStats(f"{request.method} {request.url.path}")
+            token = current_stats.set(stats)
+            try:
+                response = await process(handler, request, receive, send)
+            finally:
+                current_stats.reset(token)
+                if query_stats:
+                    self.run_stats_hooks(request, stats)
+
+            # Strict budgets are checked by the handlers' connection contexts
+            if any(budget) and not strict:
+                self.check_budget(stats, budget, response)
+
+            if query_stats_header:
+                self.add_stats_header(stats, response)
+
+            return response
 
         return middleware
 
@@ -167,14 +730,39 @@ class Plugin(BasePlugin):
         if backend.name == "asyncpg":
             return JSONAsyncPGField(default=factory, **kwargs)
 
+        codec = self.json_codec
         if backend.db_type == "postgresql":
+            kwargs.setdefault("dumps", codec.dumps)
             return JSONPGField(default=factory, **kwargs)
 
+        kwargs.setdefault("json_dumps", codec.dumps)
+        kwargs.setdefault("json_loads", codec.loads)
+        kwargs.setdefault("lazy", self.cfg.json_lazy)
         if backend.db_type == "sqlite":
             return JSONSQLiteField(default=factory, **kwargs)
 
         return JSONLikeField(default=factory, **kwargs)
 
+    def JSONStructField(self, schema: type[TV], **kwargs) -> JSONGenericField[TV]:  # noqa: N802
+        """Return a JSON field for the current backend which decodes documents into the schema.
+
+        The schema is a msgspec struct or a dataclass.
+        """
+        if self.app is None:
+            raise PluginNotInstalledError
+
+        backend = self.manager.backend
+        if backend.name == "asyncpg":
+            return JSONStructAsyncPGField(schema, **kwargs)
+
+        if backend.db_type == "postgresql":
+            return JSONStructPGField(schema, **kwargs)
+
+        if backend.db_type == "sqlite":
+            return JSONStructSQLiteField(schema, **kwargs)
+
+        return JSONStructLikeField(schema, **kwargs)
+
     @asynccontextmanager
     async def conftest(self):
         """Initialize a database schema for pytest."""
@@ -0,0 +1,251 @@
+"""Bulk load and dump data."""
+
+from __future__ import annotations
+
+import sqlite3
+from collections.abc import AsyncIterable, Iterable
+from contextlib import AsyncExitStack, suppress
+from typing import TYPE_CHECKING, Any, Literal
+from uuid import uuid4
+
+import peewee as pw
+from aio_databases.record import Record
+
+from .fields import Constructor
+
+if TYPE_CHECKING:
+    from collections.abc import AsyncIterator, Sequence
+
+    from .manager import Manager
+
+TRows = Iterable[Any] | AsyncIterable[Any]
+
+# Maximum number of parameters in a query by drivers and database types
+PARAMS_LIMITS = {
+    "asyncpg": 32767,
+    "postgresql": 65535,
+    "mysql": 65535,
+    "sqlite": 32766 if sqlite3.sqlite_version_info >= (3, 32, 0) else 999,
+}
+DEFAULT_PARAMS_LIMIT = 999
+
+
+async def iterate(rows: TRows) -> AsyncIterator[Any]:
+    """Iterate through sync or async iterables."""
+    if isinstance(rows, AsyncIterable):
+        async for row in rows:
+            yield row
+    else:
+        for row in rows:
+            yield row
+
+
+async def batches(rows: TRows, size: int) -> AsyncIterator[list[Any]]:
+    """Split sync or async iterables into batches."""
+    batch: list[Any] = []
+    async for row in iterate(rows):
+        batch.append(row)
+        if len(batch) >= size:
+            yield batch
+            batch = []
+
+    if batch:
+        yield batch
+
+
+def get_fields(model_cls: type[pw.Model], fields: Sequence[pw.Field] | None) -> list[pw.Field]:
+    """Get fields to load (all except auto-incremented ones by default)."""
+    if fields is not None:
+        return list(fields)
+
+    return [field for field in model_cls._meta.sorted_fields if not isinstance(field, pw.AutoField)]
+
+
+def get_default(field: pw.Field) -> Any:
+    default = field.default
+    return default() if callable(default) else default
+
+
+async def bulk_load(
+    manager: Manager,
+    model_cls: type[pw.Model],
+    rows: TRows,
+    *,
+    fields: Sequence[pw.Field] | None = None,
+    batch_size: int = 1000,
+) -> int:
+    """Insert the rows (dicts, tuples in the fields order or model instances) into the table.
+
+    Use COPY on asyncpg and multi-row inserts otherwise. Return the number of inserted rows.
+    """
+    load_fields = get_fields(model_cls, fields)
+
+    def prepare(row: Any) -> tuple:
+        if isinstance(row, pw.Model):
+            row = row.__data__
+
+        if isinstance(row, dict):
+            row = [
+                row[field.name] if field.name in row else get_default(field)
+                for field in load_fields
+            ]
+
+        return tuple(field.db_value(value) for field, value in zip(load_fields, row, strict=True))
+
+    if manager.backend.name.startswith("asyncpg"):
+        meta = model_cls._meta
+        async with manager.connection(create=False) as conn:
+            status = await conn._conn.copy_records_to_table(
+                meta.table_name,
+                records=(prepare(row) async for row in iterate(rows)),
+                columns=[field.column_name for field in load_fields],
+                schema_name=meta.schema,
+            )
+
+        await manager.invalidate_tables({meta.table_name})
+
+        return int(status.split()[-1])
+
+    return await insert_many_batched(
+        manager, model_cls, rows, fields=load_fields, batch_size=batch_size
+    )
+
+
+def get_batch_size(manager: Manager, fields_count: int, reserved: int = 0) -> int:
+    """Get a batch size by the database's parameters limit.
+
+    The reserved parameters are used by the rest of the query (ON CONFLICT, etc).
+    """
+    backend = manager.backend
+    limit = PARAMS_LIMITS.get(backend.name.split("+")[0]) or PARAMS_LIMITS.get(
+        backend.db_type, DEFAULT_PARAMS_LIMIT
+    )
+    return max(1, (limit - reserved) // max(1, fields_count))
+
+
+def prepare_insert(
+    model_cls: type[pw.Model],
+    rows: list[Any],
+    fields: list[pw.Field],
+    on_conflict: Literal["ignore", "replace"] | dict[str, Any] | None,
+) -> pw.Insert:
+    """Build a multi-row insert with the conflict resolution."""
+    query = model_cls.insert_many(rows, fields=fields)
+    if on_conflict == "ignore":
+        return query.on_conflict_ignore()
+
+    if on_conflict == "replace":
+        return query.on_conflict_replace()
+
+    if on_conflict is not None:
+        return query.on_conflict(**on_conflict)
+
+    return query
+
+
+async def insert_many_batched(  # noqa: PLR0913
+    manager: Manager,
+    model_cls: type[pw.Model],
+    rows: TRows,
+    *,
+    fields: Sequence[pw.Field] | None = None,
+    batch_size: int | None = None,
+    on_conflict: Literal["ignore", "replace"] | dict[str, Any] | None = None,
+    transaction: Literal["all", "batch"] | None = "all",
+) -> int:
+    """Insert the rows with multi-row inserts in batches. Return the number of rows.
+
+    The batches are sized by the database's parameters limit if batch_size is not set.
+    on_conflict is "ignore", "replace" or params for Insert.on_conflict() (upsert).
+    transaction is "all" (one transaction), "batch" (a transaction per batch) or None.
+    """
+    insert_fields = get_fields(model_cls, fields)
+    if not batch_size:
+        # Count the parameters of the query without the rows
+        sample = prepare_insert(
+            model_cls, [[pw.SQL("NULL")] * len(insert_fields)], insert_fields, on_conflict
+        )
+        _, params = sample.sql()
+        batch_size = get_batch_size(manager, len(insert_fields), len(params))
+
+    count = 0
+    async with AsyncExitStack() as stack:
+        if transaction == "all":
+            await stack.enter_async_context(manager.transaction())
+
+        async for batch in batches(rows, batch_size):
+            data = [row.__data__ if isinstance(row, pw.Model) else row for row in batch]
+            query = prepare_insert(model_cls, data, insert_fields, on_conflict)
+
+            if transaction == "batch":
+                async with manager.transaction():
+                    await manager.execute(query)
+            else:
+                await manager.execute(query)
+
+            count += len(batch)
+
+    return count
+
+
+async def bulk_dump(manager: Manager, query: pw.Query, *, batch_size: int = 1000) -> AsyncIterator:
+    """Stream the query's results in batches with bounded memory.
+
+    Use a server-side cursor on PostgreSQL and the backend's cursor otherwise. The server-side
+    cursor is read through the driver's connection: it works on read-only (replica) connections
+    and the cursor's statements are not passed to the query hooks.
+    """
+    if manager.backend.db_type != "postgresql":
+        async for row in manager.iterate(query):
+            yield row
+        return
+
+    sql, params = query.sql()
+    constructor = Constructor(query)
+    async with manager.connection(create=False) as conn:
+        if conn.backend.name.startswith("asyncpg"):
+            rows = fetch_cursor(conn._conn, sql, params, batch_size)
+        else:
+            rows = fetch_declared(conn._conn, sql, params, batch_size, begin=not conn.transactions)
+
+        async for batch in rows:
+            for row in constructor(batch):
+                yield row
+
+
+async def fetch_cursor(conn: Any, sql: str, params: Sequence, size: int) -> AsyncIterator[list]:
+    """Fetch the rows by batches from an asyncpg cursor."""
+    async with conn.transaction():
+        cursor = await conn.cursor(sql, *params)
+        while rows := await cursor.fetch(size):
+            yield rows
+
+
+async def fetch_declared(
+    conn: Any, sql: str, params: Sequence, size: int, *, begin: bool
+) -> AsyncIterator[list]:
+    """Fetch the rows by batches from a declared cursor (aiopg).
+
+    The cursor requires a transaction, start it if the connection is not in one.
+    """
+    name = f"bulk_dump_{uuid4().hex}"
+    async with conn.cursor() as cursor:
+        try:
+            if begin:
+                await cursor.execute("BEGIN")
+
+            await cursor.execute(f"DECLARE {name} NO SCROLL CURSOR FOR {sql}", params)
+            while True:
+                await cursor.execute(f"FETCH {size} FROM {name}")
+                rows = await cursor.fetchall()
+                if not rows:
+                    break
+
+                yield [Record(row, cursor.description) for row in rows]
+
+        finally:
+            if begin:
+                await cursor.execute("ROLLBACK")
+            else:
+                with suppress(Exception):
+                    await cursor.execute(f"CLOSE {name}")
@@ -0,0 +1,266 @@
+"""Publish tables changes to invalidate caches in other processes."""
+
+from __future__ import annotations
+
+import abc
+import asyncio
+import json
+import logging
+import os
+import socket
+from contextlib import suppress
+from pathlib import Path
+from typing import TYPE_CHECKING, Any, Callable
+from uuid import uuid4
+
+if TYPE_CHECKING:
+    from collections.abc import Collection
+
+    from aio_databases.backends import ABCConnection
+
+    from .manager import Manager
+
+TReceiver = Callable[[bytes], Any]
+
+
+class Transport(abc.ABC):
+    """Deliver messages between processes.
+
+    The bus replaces the logger with its own one.
+    """
+
+    logger: logging.Logger = logging.getLogger("muffin_peewee")
+
+    @abc.abstractmethod
+    async def start(self, receiver: TReceiver):
+        """Start receiving messages."""
+
+    @abc.abstractmethod
+    async def publish(self, message: bytes):
+        """Send the message to the other processes."""
+
+    @abc.abstractmethod
+    async def stop(self):
+        """Stop receiving messages."""
+
+
+class PostgresTransport(Transport):
+    """LISTEN/NOTIFY on a dedicated connection (asyncpg).
+
+    A lost connection is restored with a backoff. The changes published meanwhile are lost, so
+    the local caches are reset when it's restored.
+    """
+
+    def __init__(
+        self,
+        manager: Manager,
+        channel: str = "muffin_peewee_invalidate",
+        *,
+        max_delay: float = 30.0,
+    ):
+        self.manager = manager
+        self.channel = channel
+        self.max_delay = max_delay
+        self.conn: ABCConnection | None = None
+        self.lock = asyncio.Lock()
+        self.receiver: TReceiver | None = None
+        self.task: asyncio.Task | None = None
+
+    async def start(self, receiver: TReceiver):
+        if not self.manager.backend.name.startswith("asyncpg"):
+            raise RuntimeError("Postgres invalidation transport requires asyncpg backend")
+
+        self.receiver = receiver
+        await self.listen()
+
+    async def listen(self):
+        """Acquire the connection and listen to the channel."""
+        conn = self.manager.backend.connection()
+        await conn.acquire()
+        try:
+            await conn._conn.add_listener(self.channel, self.notify)  # type: ignore[union-attr]
+            conn._conn.add_termination_listener(self.terminated)  # type: ignore[union-attr]
+        except BaseException:
+            await conn.release()
+            raise
+
+        self.conn = conn
+
+    def notify(self, _conn: Any, _pid: int, _channel: str, payload: str):
+        if self.receiver is not None:
+            self.receiver(payload.encode())
+
+    def terminated(self, _conn: Any):
+        """Reconnect when the connection is lost."""
+        conn, self.conn = self.conn, None
+        self.logger.warning("Invalidation connection is lost, reconnecting: %r", conn)
+        if self.task is None:
+            self.task = asyncio.create_task(self.reconnect(conn))
+
+    async def reconnect(self, conn: ABCConnection | None):
+        """Restore the connection with a backoff and reset the local caches."""
+        if conn is not None:
+            with suppress(Exception):
+                await conn.release()
+
+        delay = 0.1
+        while True:
+            await asyncio.sleep(delay)
+            try:
+                await self.listen()
+                break
+            except Exception:
+                self.logger.warning("Invalidation connection failed", exc_info=True)
+                delay = min(delay * 2, self.max_delay)
+
+        self.task = None
+        self.logger.warning("Invalidation connection is restored")
+        bus = self.manager.bus
+        if bus is not None:
+            await bus.reset()
+
+    async def publish(self, message: bytes):
+        if self.conn is None:
+            raise RuntimeError("The transport is not connected")
+
+        async with self.lock:
+            await self.conn._conn.execute(  # type: ignore[union-attr]
+                "SELECT pg_notify($1, $2)", self.channel, message.decode()
+            )
+
+    async def stop(self):
+        task, self.task = self.task, None
+        if task is not None:
+            task.cancel()
+            with suppress(asyncio.CancelledError):
+                await task
+
+        conn, self.conn = self.conn, None
+        if conn is not None:
+            conn._conn.remove_termination_listener(self.terminated)  # type: ignore[union-attr]
+            await conn.release()
+
+
+class ReceiverProtocol(asyncio.DatagramProtocol):
+    def __init__(self, receiver: TReceiver):
+        self.receiver = receiver
+
+    def datagram_received(self, data: bytes, _: Any):
+        self.receiver(data)
+
+
+class SocketTransport(Transport):
+    """Unix datagram sockets in a shared directory (a socket per process).
+
+    Useful for the processes on the same host and for tests.
+    """
+
+    def __init__(self, path: str | Path):
+        self.path = Path(path)
+        self.address = self.path / f"{os.getpid()}-{uuid4().hex[:8]}.sock"
+        self.transport: asyncio.DatagramTransport | None = None
+        self.dropped = 0
+        self.sock = socket.socket(socket.AF_UNIX, socket.SOCK_DGRAM)
+        self.sock.setblocking(False)  # noqa: FBT003
+
+    async def start(self, receiver: TReceiver):
+        self.path.mkdir(parents=True, exist_ok=True)
+        self.transport, _ = await asyncio.get_running_loop().create_datagram_endpoint(
+            lambda: ReceiverProtocol(receiver), local_addr=str(self.address), family=socket.AF_UNIX
+        )
+
+    async def publish(self, message: bytes):
+        for address in self.path.glob("*.sock"):
+            if address == self.address:
+                continue
+
+            try:
+                self.sock.sendto(message, str(address))
+            except (ConnectionRefusedError, FileNotFoundError):
+                # The process is gone
+                address.unlink(missing_ok=True)
+            except BlockingIOError:
+                # The process doesn't keep up with the messages
+                self.dropped += 1
+                self.logger.warning(
+                    "Invalidation message is dropped (%d): %s", self.dropped, address
+                )
+
+    async def stop(self):
+        if self.transport is not None:
+            self.transport.close()
+            self.transport = None
+
+        self.sock.close()
+        self.address.unlink(missing_ok=True)
+
+
+class InvalidationBus:
+    """Publish the changed tables and invalidate the local caches by the other processes.
+
+    The manager publishes the changes made in a transaction when the transaction is finished.
+    """
+
+    def __init__(self, manager: Manager, transport: Transport, logger: logging.Logger):
+        self.manager = manager
+        self.transport = transport
+        self.logger = transport.logger = logger
+        self.origin = uuid4().hex
+        self.handlers: list[Callable[[set[str]], Any]] = []
+        self.tasks: set[asyncio.Task] = set()
+
+    def __repr__(self) -> str:
+        return f"<InvalidationBus {self.transport!r}>"
+
+    async def start(self):
+        await self.transport.start(self.receive)
+
+    async def stop(self):
+        if self.tasks:
+            await asyncio.gather(*self.tasks, return_exceptions=True)
+
+        await self.transport.stop()
+
+    async def publish(self, tables: Collection[str]):
+        message = json.dumps({"origin": self.origin, "tables": sorted(tables)})
+        try:
+            await self.transport.publish(message.encode())
+        except Exception:
+            self.logger.exception("Failed to publish the tables changes: %s", tables)
+
+    def receive(self, message: bytes):
+        """Invalidate the local caches by the message from another process."""
+        try:
+            data = json.loads(message)
+        except ValueError:
+            self.logger.warning("Invalid invalidation message: %r", message)
+            return
+
+        if data.get("origin") != self.origin:
+            self.run(self.invalidate(set(data.get("tables", ()))))
+
+    async def invalidate(self, tables: set[str]):
+        cache = self.manager.query_cache
+        if cache is not None:
+            await cache.backend.invalidate(tables)
+
+        for handler in self.handlers:
+            try:
+                res = handler(tables)
+                if asyncio.iscoroutine(res):
+                    await res
+            except Exception:
+                self.logger.exception("Invalidation handler failed: %r", handler)
+
+    async def reset(self):
+        """Drop the local caches (when the changes from other processes could be lost)."""
+        cache = self.manager.query_cache
+        if cache is not None:
+            await cache.backend.clear()
+
+        await self.invalidate({model._meta.table_name for model in self.manager.models})
+
+    def run(self, coro):
+        task = asyncio.create_task(coro)
+        self.tasks.add(task)
+        task.add_done_callback(self.tasks.discard)
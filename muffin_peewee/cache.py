@@ -0,0 +1,185 @@
+"""Cache queries results."""
+
+from __future__ import annotations
+
+import abc
+import re
+from collections import OrderedDict
+from hashlib import sha1
+from time import monotonic
+from typing import TYPE_CHECKING, Any
+
+import peewee as pw
+from aio_databases.record import Record
+
+from .fields import Constructor
+
+if TYPE_CHECKING:
+    from collections.abc import Collection
+
+    from .manager import Manager
+
+MISSING = object()
+
+RE_WRITE_TABLE = re.compile(
+    r"^\s*(?:INSERT(?:\s+OR\s+\w+)?\s+INTO|REPLACE\s+INTO|UPDATE|DELETE\s+FROM|TRUNCATE(?:\s+TABLE)?)"
+    r"\s+(?:[`\"]?\w+[`\"]?\.)?[`\"]?(\w+)",
+    re.IGNORECASE,
+)
+
+
+class CacheBackend(abc.ABC):
+    """A storage for cached results.
+
+    Implement the interface to share the cache between processes (Redis, Memcached, etc).
+    The values are tuples of builtins and the fields values.
+    """
+
+    @abc.abstractmethod
+    async def get(self, key: str) -> Any:
+        """Get a value (MISSING if the key is not found or expired)."""
+
+    @abc.abstractmethod
+    async def set(self, key: str, value: Any, *, ttl: float, tables: Collection[str]):
+        """Store the value for ttl seconds. Tag it with the tables to invalidate it."""
+
+    @abc.abstractmethod
+    async def invalidate(self, tables: Collection[str]):
+        """Remove the values which are tagged with any of the tables."""
+
+    @abc.abstractmethod
+    async def clear(self):
+        """Remove all the values."""
+
+
+class LRUCacheBackend(CacheBackend):
+    """In-process cache with LRU eviction."""
+
+    def __init__(self, maxsize: int = 1024):
+        self.maxsize = maxsize
+        self.values: OrderedDict[str, tuple[float, Any, Collection[str]]] = OrderedDict()
+        self.tables: dict[str, set[str]] = {}
+
+    def __repr__(self) -> str:
+        return f"<LRUCacheBackend {len(self.values)}/{self.maxsize}>"
+
+    async def get(self, key: str) -> Any:
+        item = self.values.get(key)
+        if item is None:
+            return MISSING
+
+        expires, value, _ = item
+        if expires and expires < monotonic():
+            self.remove(key)
+            return MISSING
+
+        self.values.move_to_end(key)
+        return value
+
+    async def set(self, key: str, value: Any, *, ttl: float, tables: Collection[str]):
+        self.remove(key)
+        self.values[key] = (ttl and monotonic() + ttl, value, tables)
+        for table in tables:
+            self.tables.setdefault(table, set()).add(key)
+
+        while len(self.values) > self.maxsize:
+            self.remove(next(iter(self.values)))
+
+    async def invalidate(self, tables: Collection[str]):
+        for table in tables:
+            for key in self.tables.pop(table, ()):
+                self.remove(key)
+
+    async def clear(self):
+        self.values.clear()
+        self.tables.clear()
+
+    def remove(self, key: str):
+        item = self.values.pop(key, None)
+        if item is None:
+            return
+
+        for table in item[2]:
+            keys = self.tables.get(table)
+            if keys is not None:
+                keys.discard(key)
+
+
+class TablesContext(pw.Context):
+    """Compile queries collecting the tables they read."""
+
+    def __init__(self, **settings):
+        super().__init__(**settings)
+        self.tables: set[str] = set()
+
+    def sql(self, obj):
+        if pw.is_model(obj):
+            self.tables.add(obj._meta.table_name)
+        elif isinstance(obj, pw.ModelAlias):
+            self.tables.add(obj.model._meta.table_name)
+        elif isinstance(obj, pw.Table):
+            self.tables.add(obj.__name__)
+
+        return super().sql(obj)
+
+
+def get_write_table(query: Any) -> str | None:
+    """Get the table which is changed by the query (None for reading queries)."""
+    if isinstance(query, str):
+        match = RE_WRITE_TABLE.match(query)
+        return match and match.group(1)
+
+    if isinstance(query, (pw.Insert, pw.Update, pw.Delete)):
+        table = query.table
+        return table._meta.table_name if pw.is_model(table) else table.__name__
+
+    return None
+
+
+class QueryCache:
+    """Cache queries results keyed by their SQL and parameters."""
+
+    __slots__ = "backend", "hits", "manager", "misses", "ttl"
+
+    def __init__(self, manager: Manager, backend: CacheBackend, *, ttl: float = 60.0):
+        self.manager = manager
+        self.backend = backend
+        self.ttl = ttl
+        self.hits = 0
+        self.misses = 0
+
+    def __repr__(self) -> str:
+        return f"<QueryCache {self.backend!r}>"
+
+    async def get(self, query: pw.SelectBase, ttl: float | None = None) -> list[Any]:
+        """Get the query's results from the cache or from the database.
+
+        Bypass the cache for the tables changed in the current transaction.
+        """
+        manager = self.manager
+        ctx = TablesContext(**manager.pw_database.get_context_options())
+        sql, params = ctx.sql(query).query()
+
+        # Don't share the uncommitted changes of the current transaction
+        conn = manager.current_conn
+        pending = None if conn is None else manager.pending.get(conn)
+        if pending and not pending.isdisjoint(ctx.tables):
+            self.misses += 1
+            return Constructor(query)(await manager.fetchall(sql, *params, raw=True))
+
+        key = sha1(f"{sql}\x00{params!r}".encode(), usedforsecurity=False).hexdigest()
+        value = await self.backend.get(key)
+        if value is MISSING:
+            self.misses += 1
+            rows = await manager.fetchall(sql, *params, raw=True)
+            keys = tuple(rows[0].keys()) if rows else ()
+            value = (keys, [tuple(row.values()) for row in rows])
+            await self.backend.set(
+                key, value, ttl=self.ttl if ttl is None else ttl, tables=ctx.tables
+            )
+        else:
+            self.hits += 1
+
+        keys, rows = value
+        description = [[name] for name in keys]
+        return Constructor(query)([Record(row, description) for row in rows])
@@ -0,0 +1,152 @@
+"""Cache compiled SQL of parameterized queries."""
+
+from __future__ import annotations
+
+from collections import OrderedDict
+from inspect import signature
+from typing import TYPE_CHECKING, Any, Callable, NamedTuple
+
+import peewee as pw
+
+from .fields import Constructor
+
+if TYPE_CHECKING:
+    from . import Plugin
+    from .manager import Manager
+
+
+class Slot:
+    """A placeholder for a parameter of a compiled query."""
+
+    __slots__ = ("name",)
+
+    def __init__(self, name: str):
+        self.name = name
+
+    def __repr__(self) -> str:
+        return f"<Slot {self.name}>"
+
+
+class SlotContext(pw.Context):
+    """Compile queries keeping the parameters slots with their converters."""
+
+    def __init__(self, **settings):
+        super().__init__(**settings)
+        self.slots: list[tuple[int, str, Callable | None]] = []
+
+    def value(self, value, converter=None, add_param=True):  # noqa: FBT002
+        if not isinstance(value, Slot):
+            return super().value(value, converter, add_param)
+
+        if converter is None:
+            converter = self.state.converter
+
+        self.slots.append((len(self._values), value.name, converter or None))
+        self._values.append(value)
+        return self.literal(self.state.param or "?") if add_param else self
+
+
+class CompiledSQL(NamedTuple):
+    """Compiled SQL with the parameters slots."""
+
+    sql: str
+    params: list[Any]
+    slots: list[tuple[int, str, Callable | None]]
+    constructor: Constructor | None
+
+    def bind(self, values: dict[str, Any]) -> list[Any]:
+        """Get the query's parameters for the given values."""
+        params = list(self.params)
+        for idx, name, converter in self.slots:
+            value = values[name]
+            params[idx] = converter(value) if converter else value
+
+        return params
+
+
+class SQLCache:
+    """Compiled SQL by query shapes (builders) with LRU eviction."""
+
+    __slots__ = "entries", "hits", "maxsize", "misses"
+
+    def __init__(self, maxsize: int = 512):
+        self.maxsize = maxsize
+        self.entries: OrderedDict[Callable, CompiledSQL] = OrderedDict()
+        self.hits = 0
+        self.misses = 0
+
+    def __repr__(self) -> str:
+        return f"<SQLCache {len(self.entries)} queries, hit rate {self.hit_rate:.2%}>"
+
+    @property
+    def hit_rate(self) -> float:
+        total = self.hits + self.misses
+        return self.hits / total if total else 0.0
+
+    def get(self, builder: Callable, manager: Manager) -> CompiledSQL:
+        """Get compiled SQL for the builder (compile the query on the first call)."""
+        entries = self.entries
+        compiled = entries.get(builder)
+        if compiled is not None:
+            self.hits += 1
+            entries.move_to_end(builder)
+            return compiled
+
+        self.misses += 1
+        compiled = entries[builder] = compile_query(builder, manager)
+        if len(entries) > self.maxsize:
+            entries.popitem(last=False)
+
+        return compiled
+
+    def clear(self):
+        """Clear the cache and the stats."""
+        self.entries.clear()
+        self.hits = self.misses = 0
+
+
+def compile_query(builder: Callable, manager: Manager) -> CompiledSQL:
+    """Build the query with slots as the parameters and compile it."""
+    slots = {name: Slot(name) for name in signature(builder).parameters}
+    query = builder(**slots)
+    ctx = SlotContext(**manager.pw_database.get_context_options())
+    sql, params = ctx.sql(query).query()
+    returning = isinstance(query, pw.SelectBase) or getattr(query, "_returning", None)
+    return CompiledSQL(sql, params, ctx.slots, Constructor(query) if returning else None)
+
+
+class CompiledQuery:
+    """A parameterized query which is compiled once.
+
+    The builder gets slots as the parameters and has to return a query of the same shape for
+    any values (don't branch on the parameters). The compiled SQL is cached by the builder,
+    so define the builders once (on the module level), not per call.
+    """
+
+    __slots__ = "builder", "plugin", "signature"
+
+    def __init__(self, builder: Callable[..., pw.Query], plugin: Plugin):
+        self.builder = builder
+        self.plugin = plugin
+        self.signature = signature(builder)
+
+    def __repr__(self) -> str:
+        return f"<CompiledQuery {self.builder.__name__}>"
+
+    async def __call__(self, *args, **kwargs) -> Any:
+        """Execute the query with the given parameters.
+
+        Return the processed rows for selects (and queries with RETURNING).
+        """
+        # The plugin's manager is resolved on calls (the plugin could be set up after)
+        plugin = self.plugin
+        manager = plugin.manager
+        compiled = plugin.sql_cache.get(self.builder, manager)
+        bound = self.signature.bind(*args, **kwargs)
+        bound.apply_defaults()
+        params = compiled.bind(bound.arguments)
+        if compiled.constructor is None:
+            return await manager.execute(compiled.sql, *params)
+
+        rows = await manager.fetchall(compiled.sql, *params)
+        return compiled.constructor(rows)
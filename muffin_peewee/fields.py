@@ -6,20 +6,56 @@ import json
 from contextlib import suppress
 from datetime import datetime, timezone
 from enum import EnumMeta
-from typing import TYPE_CHECKING, Any, Generic, Literal, cast, overload
+from typing import TYPE_CHECKING, Any, Callable, Generic, Literal, cast, overload
 
 import peewee as pw
 from asgi_tools.types import TV
 from peewee_aio.fields import GenericField, JSONGenericField
+from peewee_aio.manager import Constructor as BaseConstructor
+from peewee_aio.manager import FakeCursor
 from playhouse.postgres_ext import JSONField as PGJSONField
+from playhouse.postgres_ext import JsonPath
 from playhouse.sqlite_ext import JSONField as SQLiteJSONField
 
+from .json_codec import get_struct_codec
+
 if TYPE_CHECKING:
-    from .types import TJSONDump, TJSONLoad
+    from .json_codec import StructCodec
+    from .types import TJSONDump, TJSONLoad, TJSONPath
+
+
+def get_path_keys(path: TJSONPath) -> tuple[str | int, ...]:
+    """Get keys from a JSON path (a key or a sequence of keys)."""
+    return (path,) if isinstance(path, (str, int)) else tuple(path)
+
+
+def get_json_path(path: TJSONPath) -> str:
+    """Convert the given JSON path to SQLite/MySQL format ($."key"[0])."""
+    return "$" + "".join(
+        f"[{key}]" if isinstance(key, int) else f".{json.dumps(key)}" for key in get_path_keys(path)
+    )
 
 
 class JSONPGField(JSONGenericField[TV], PGJSONField):  # type: ignore[inconsistent-inheritance]
-    pass
+    def get_path(self, path: TJSONPath) -> pw.Node:
+        """Extract a value (as text) by the given path."""
+        return JsonPath(self, [str(key) for key in get_path_keys(path)])
+
+    def set_path(self, path: TJSONPath, value: Any) -> pw.Node:
+        """Get an expression to update a value by the given path."""
+        keys = [str(key) for key in get_path_keys(path)]
+        value = self.db_value(value)
+        if not isinstance(value, pw.Node):
+            value = pw.Value(value, unpack=False)
+
+        return pw.Cast(
+            pw.fn.jsonb_set(
+                pw.Cast(self, "jsonb"),
+                pw.Cast(pw.Value(keys, unpack=False), "text[]"),
+                pw.Cast(value, "jsonb"),
+            ),
+            "json",
+        )
 
 
 class JSONAsyncPGField(JSONPGField[TV]):
@@ -33,8 +69,108 @@ class JSONAsyncPGField(JSONPGField[TV]):
         return value
 
 
-class JSONSQLiteField(JSONGenericField[TV], SQLiteJSONField):  # type: ignore[inconsistent-inheritance]
-    pass
+class RawJSON:
+    """A JSON document which is not decoded yet."""
+
+    __slots__ = "data", "loads"
+
+    def __init__(self, data: str | bytes, loads: Callable[[Any], Any]):
+        self.data = data
+        self.loads = loads
+
+    def __repr__(self) -> str:
+        return f"<RawJSON {self.data[:40]!r}>"
+
+    def decode(self) -> Any:
+        """Decode the document."""
+        return self.loads(self.data)
+
+
+class LazyJSONAccessor(pw.FieldAccessor):
+    """Decode JSON documents on the first access."""
+
+    def __get__(self, instance, instance_type=None):
+        if instance is None:
+            return self.field
+
+        data = instance.__data__
+        value = data.get(self.name)
+        if isinstance(value, RawJSON):
+            value = data[self.name] = value.decode()
+
+        return value
+
+
+class LazyJSONMixin:
+    """Support lazy decoding for JSON fields.
+
+    In lazy mode the raw documents are decoded on the first access to the model attributes
+    and are written back unchanged if they were not accessed.
+    """
+
+    def __init__(self, *args, lazy: bool = False, **kwargs):
+        """Initialize the field."""
+        super().__init__(*args, **kwargs)
+        self.lazy = lazy
+        if lazy:
+            self.accessor_class = LazyJSONAccessor
+
+    def python_value(self, value):
+        """Keep the raw documents in lazy mode."""
+        if self.lazy and isinstance(value, (str, bytes)):
+            return RawJSON(value, super().python_value)
+
+        return super().python_value(value)  # type: ignore[misc]
+
+    def decode(self, value):
+        """Decode the documents eagerly."""
+        return super().python_value(value)  # type: ignore[misc]
+
+    def db_value(self, value):
+        """Write the raw documents back unchanged."""
+        if isinstance(value, RawJSON):
+            return value.data
+
+        return super().db_value(value)  # type: ignore[misc]
+
+
+def is_model_wrapper(wrapper: Any) -> bool:
+    """Check the cursor wrapper builds model instances."""
+    if isinstance(wrapper, pw.ModelObjectCursorWrapper):
+        return wrapper.is_model
+
+    return isinstance(wrapper, pw.ModelCursorWrapper)
+
+
+class Constructor(BaseConstructor):
+    """Process results. Keep lazy JSON documents raw for model rows only."""
+
+    __slots__ = ()
+
+    def get_processor(self, rec):
+        if self.processor is None:
+            wrapper = self.query._get_cursor_wrapper(FakeCursor(rec))  # type: ignore[attr-defined]
+            wrapper.initialize()
+            if not is_model_wrapper(wrapper):
+                for idx, field in enumerate(getattr(wrapper, "fields", ())):
+                    if isinstance(field, pw.FieldAlias):
+                        field = field.field  # noqa: PLW2901
+                    if isinstance(field, LazyJSONMixin) and field.lazy:
+                        wrapper.converters[idx] = field.decode
+
+            self.processor = wrapper.process_row
+
+        return self.processor
+
+
+class JSONSQLiteField(LazyJSONMixin, JSONGenericField[TV], SQLiteJSONField):  # type: ignore[inconsistent-inheritance]
+    def get_path(self, path: TJSONPath) -> pw.Node:
+        """Extract a value by the given path."""
+        return pw.fn.json_extract(self, get_json_path(path))
+
+    def set_path(self, path: TJSONPath, value: Any) -> pw.Node:
+        """Get an expression to update a value by the given path."""
+        return pw.fn.json_set(self, get_json_path(path), pw.fn.json(self._json_dumps(value)))
 
 
 class JSONAsyncSQLiteField(JSONSQLiteField):
@@ -42,8 +178,8 @@ class JSONAsyncSQLiteField(JSONSQLiteField):
         return value
 
 
-class JSONLikeField(JSONGenericField[TV], pw.Field):
-    """Implement JSON field."""
+class JSONTextField(JSONGenericField[TV], pw.Field):
+    """Implement JSON field for text columns."""
 
     unpack = False
     field_type = "text"
@@ -75,6 +211,69 @@ class JSONLikeField(JSONGenericField[TV], pw.Field):
 
         return self._json_dumps(value)
 
+    def get_path(self, path: TJSONPath) -> pw.Node:
+        """Extract a value (as text) by the given path (MySQL/MariaDB JSON functions)."""
+        return pw.fn.JSON_UNQUOTE(pw.fn.JSON_EXTRACT(self, get_json_path(path)))
+
+    def set_path(self, path: TJSONPath, value: Any) -> pw.Node:
+        """Get an expression to update a value by the given path (MySQL/MariaDB JSON functions)."""
+        return pw.fn.JSON_SET(
+            self, get_json_path(path), pw.fn.JSON_EXTRACT(self._json_dumps(value), "$")
+        )
+
+
+class JSONLikeField(LazyJSONMixin, JSONTextField[TV]):
+    """Implement JSON field."""
+
+
+class JSONStructMixin:
+    """Decode JSON documents straight into a struct/dataclass type (msgspec)."""
+
+    def __init__(self, schema: type, *args, **kwargs):
+        """Initialize the field."""
+        self.schema = schema
+        self.codec = codec = get_struct_codec(schema)
+        super().__init__(*args, **self.get_codec_params(codec), **kwargs)
+
+    def get_codec_params(self, codec: StructCodec) -> dict[str, Any]:
+        """Get params to setup the base field with the codec."""
+        return {"json_dumps": codec.dumps, "json_loads": codec.loads}
+
+    def python_value(self, value):
+        """Decode or convert (documents decoded by a driver) the value."""
+        if value is None or isinstance(value, self.schema):
+            return value
+
+        if isinstance(value, (str, bytes)):
+            return self.codec.loads(value)
+
+        return self.codec.convert(value)
+
+
+class JSONStructPGField(JSONStructMixin, JSONPGField[TV]):
+    def get_codec_params(self, codec: StructCodec) -> dict[str, Any]:
+        return {"dumps": codec.dumps}
+
+
+class JSONStructAsyncPGField(JSONStructMixin, JSONAsyncPGField[TV]):
+    def get_codec_params(self, _: StructCodec) -> dict[str, Any]:
+        return {}
+
+    def db_value(self, value):
+        # asyncpg encodes the documents with its JSON codec
+        if value is None or isinstance(value, pw.Node):
+            return value
+
+        return self.codec.to_builtins(value)
+
+
+class JSONStructSQLiteField(JSONStructMixin, JSONSQLiteField[TV]):
+    pass
+
+
+class JSONStructLikeField(JSONStructMixin, JSONLikeField[TV]):
+    pass
+
 
 class EnumMixin(Generic[TV]):
     """Implement enum mixin."""
@@ -0,0 +1,88 @@
+"""Request-scoped identity map."""
+
+from __future__ import annotations
+
+from contextlib import contextmanager
+from contextvars import ContextVar
+from typing import TYPE_CHECKING, Any
+
+import peewee as pw
+
+if TYPE_CHECKING:
+    from collections.abc import Generator
+
+current_identity: ContextVar[IdentityMap | None] = ContextVar("current_identity", default=None)
+
+MISSING = object()
+
+
+class IdentityMap:
+    """Loaded model instances by their primary keys."""
+
+    __slots__ = ("instances",)
+
+    def __init__(self):
+        self.instances: dict[tuple[type[pw.Model], Any], pw.Model] = {}
+
+    def __repr__(self) -> str:
+        return f"<IdentityMap {len(self.instances)} instances>"
+
+    def __len__(self) -> int:
+        return len(self.instances)
+
+    def get(self, model_cls: type[pw.Model], pk: Any) -> pw.Model | None:
+        return self.instances.get((model_cls, pk))
+
+    def add(self, inst: pw.Model):
+        pk = inst._meta.primary_key.db_value(inst._pk)  # type: ignore[attr-defined]
+        self.instances[type(inst), pk] = inst
+
+    def discard(self, model_cls: type[pw.Model], pk: Any = MISSING):
+        """Discard the instance (or all the model's instances)."""
+        if pk is not MISSING:
+            self.instances.pop((model_cls, pk), None)
+            return
+
+        for key in [key for key in self.instances if key[0] is model_cls]:
+            del self.instances[key]
+
+    def clear(self):
+        """Discard all the instances."""
+        self.instances.clear()
+
+
+@contextmanager
+def identity_scope() -> Generator[IdentityMap, None, None]:
+    """Track loaded instances in the context."""
+    identity = IdentityMap()
+    token = current_identity.set(identity)
+    try:
+        yield identity
+    finally:
+        current_identity.reset(token)
+
+
+def get_pk_lookup(model_cls: type[pw.Model], args: tuple, kwargs: dict) -> Any:
+    """Get the primary key if the filters are a lookup by it (MISSING otherwise)."""
+    pk = model_cls._meta.primary_key  # type: ignore[attr-defined]
+    if not pk:
+        return MISSING
+
+    if kwargs:
+        value = kwargs.get(pk.name, MISSING) if len(kwargs) == 1 and not args else MISSING
+
+    elif len(args) == 1:
+        expr = args[0]
+        value = (
+            expr.rhs
+            if isinstance(expr, pw.Expression)
+            and expr.op == pw.OP.EQ
+            and expr.lhs is pk
+            and not isinstance(expr.rhs, pw.Node)
+            else MISSING
+        )
+
+    else:
+        return MISSING
+
+    return MISSING if value is MISSING else pk.db_value(value)
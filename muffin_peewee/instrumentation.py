@@ -0,0 +1,332 @@
+"""Measure executed queries."""
+
+from __future__ import annotations
+
+import asyncio
+import contextlib
+import re
+import traceback
+from contextvars import ContextVar
+from inspect import getfile
+from pathlib import Path
+from random import random
+from time import perf_counter
+from typing import TYPE_CHECKING, Any, Callable
+
+import aio_databases
+import peewee as pw
+import peewee_aio
+from aio_databases.database import Database, current_conn
+
+if TYPE_CHECKING:
+    import logging
+    from collections.abc import AsyncIterator, Sequence
+
+    from .manager import Manager
+
+current_stats: ContextVar[QueryStats | None] = ContextVar("current_stats", default=None)
+
+RE_PLACEHOLDER = re.compile(r"\$\d+|%s")
+RE_LITERAL = re.compile(r"'(?:[^']|'')*'|\b\d+(?:\.\d+)?\b")
+RE_PLACEHOLDERS_LIST = re.compile(r"\(\s*\?(?:\s*,\s*\?)*\s*\)")
+
+# Skip the frames of the libraries to find a call site
+LIBRARY_PATHS = (
+    *(str(Path(getfile(module)).parent) for module in (aio_databases, asyncio, peewee_aio)),
+    getfile(contextlib),
+    getfile(pw),
+    str(Path(__file__).parent),
+)
+
+# Prefixes to get a query plan (and to execute the query with the plan) by database types
+EXPLAIN_QUERIES: dict[str, tuple[str, str | None]] = {
+    "postgresql": ("EXPLAIN ", "EXPLAIN ANALYZE "),
+    "mysql": ("EXPLAIN FORMAT=TREE ", "EXPLAIN ANALYZE "),
+    "sqlite": ("EXPLAIN QUERY PLAN ", None),
+}
+EXPLAIN_STATEMENTS = ("SELECT", "INSERT", "UPDATE", "DELETE", "WITH")
+
+
+class QueryRecord:
+    """An executed query."""
+
+    __slots__ = "duration", "params", "replica", "rows", "sql"
+
+    def __init__(
+        self,
+        sql: str,
+        params: Sequence | None,
+        duration: float,
+        rows: int | None = None,
+        *,
+        replica: bool = False,
+    ):
+        self.sql = sql
+        self.params = params
+        self.duration = duration
+        self.rows = rows
+        self.replica = replica
+
+    def __repr__(self) -> str:
+        return f"<QueryRecord {self.sql!r} {self.duration * 1000:.2f}ms>"
+
+
+class QueryStats:
+    """Queries executed in a context (a request)."""
+
+    __slots__ = "count", "duration", "queries", "route", "shapes"
+
+    def __init__(self, route: str | None = None):
+        self.route = route
+        self.count = 0
+        self.duration = 0.0
+        self.queries: list[QueryRecord] = []
+        self.shapes: dict[str, int] = {}
+
+    def __repr__(self) -> str:
+        return f"<QueryStats {self.count} queries {self.duration * 1000:.2f}ms>"
+
+    def add(self, record: QueryRecord):
+        """Add the given query."""
+        self.count += 1
+        self.duration += record.duration
+        self.queries.append(record)
+
+
+def collect_stats(record: QueryRecord):
+    """Add the query into the current stats."""
+    stats = current_stats.get()
+    if stats is not None:
+        stats.add(record)
+
+
+def normalize_sql(sql: str) -> str:
+    """Get the query's shape: replace literals and collapse lists of placeholders."""
+    sql = RE_PLACEHOLDER.sub("?", sql)
+    sql = RE_LITERAL.sub("?", sql)
+    return RE_PLACEHOLDERS_LIST.sub("(?)", sql)
+
+
+def get_call_site() -> str | None:
+    """Find the first frame outside of the database libraries."""
+    for frame in reversed(traceback.extract_stack()):
+        if not frame.filename.startswith(LIBRARY_PATHS):
+            return f"{frame.filename}:{frame.lineno} in {frame.name}"
+
+    return None
+
+
+class NPlusOneError(RuntimeError):
+    """Raised when the same query is repeated in a request too many times."""
+
+
+class QueryBudgetError(RuntimeError):
+    """Raised when a request exceeds its query budget (in strict mode)."""
+
+
+class NPlusOneDetector:
+    """Detect queries with the same shape repeated in a request (N+1 problem)."""
+
+    __slots__ = "logger", "raise_error", "threshold"
+
+    def __init__(self, threshold: int, logger: logging.Logger, *, raise_error: bool = False):
+        self.threshold = threshold
+        self.logger = logger
+        self.raise_error = raise_error
+
+    def __call__(self, record: QueryRecord):
+        stats = current_stats.get()
+        if stats is None:
+            return
+
+        shape = normalize_sql(record.sql)
+        count = stats.shapes[shape] = stats.shapes.get(shape, 0) + 1
+        if count != self.threshold + 1:
+            return
+
+        msg = f"N+1 queries detected ({count}+ times) at {get_call_site()}: {shape}"
+        if self.raise_error:
+            raise NPlusOneError(msg)
+
+        self.logger.warning(msg)
+
+
+class SlowQueryLog:
+    """Log slow queries with their plans.
+
+    The plans are captured in background on separate connections.
+    """
+
+    __slots__ = "analyze_rate", "explain", "logger", "manager", "tasks", "threshold"
+
+    def __init__(
+        self,
+        manager: Manager,
+        threshold: float,
+        logger: logging.Logger,
+        *,
+        explain: bool = False,
+        analyze_rate: float = 0.0,
+    ):
+        self.manager = manager
+        self.threshold = threshold
+        self.logger = logger
+        self.explain = explain
+        self.analyze_rate = analyze_rate
+        self.tasks: set[asyncio.Task] = set()
+
+    def __call__(self, record: QueryRecord):
+        if record.duration < self.threshold:
+            return
+
+        stats = current_stats.get()
+        route = stats and stats.route
+        explain = self.get_explain(record)
+        if explain is None:
+            return self.log(record, route)
+
+        task = asyncio.create_task(self.capture(record, route, explain))
+        self.tasks.add(task)
+        task.add_done_callback(self.tasks.discard)
+        return None
+
+    def get_explain(self, record: QueryRecord) -> str | None:
+        """Get a prefix to explain the query (None if the query can't be explained)."""
+        if not self.explain or record.params is None:
+            return None
+
+        explain, analyze = EXPLAIN_QUERIES.get(self.manager.backend.db_type, (None, None))
+        statement = record.sql.lstrip()[:6].upper()
+        if explain is None or not statement.startswith(EXPLAIN_STATEMENTS):
+            return None
+
+        # EXPLAIN ANALYZE executes the query, so use it for sampled selects only
+        if analyze and statement == "SELECT" and random() < self.analyze_rate:  # noqa: S311
+            return analyze
+
+        return explain
+
+    async def capture(self, record: QueryRecord, route: str | None, explain: str):
+        """Get the query's plan and log the query."""
+        plan = None
+        try:
+            async with self.manager.connection() as conn:
+                rows = await conn.fetchall(f"{explain}{record.sql}", *(record.params or ()))
+            plan = "\n".join(str(tuple(row)[-1]) for row in rows)
+        except Exception:
+            self.logger.warning("Failed to explain the query: %s", record.sql, exc_info=True)
+
+        self.log(record, route, plan)
+
+    def log(self, record: QueryRecord, route: str | None, plan: str | None = None):
+        """Log the slow query."""
+        self.logger.warning(
+            "Slow query (%.2fms) from %s: %s%s",
+            record.duration * 1000,
+            route or "-",
+            record.sql,
+            f"\n{plan}" if plan else "",
+        )
+
+    async def stop(self):
+        """Wait for the pending plans."""
+        if self.tasks:
+            await asyncio.gather(*self.tasks, return_exceptions=True)
+
+
+class InstrumentedDatabase(Database):
+    """Measure executed queries and run the hooks for them."""
+
+    query_hooks: list[Callable[[QueryRecord], Any]]
+    redact_params: bool = False
+
+    def record(self, query: Any, params: Sequence, start: float, rows: int | None = None):
+        """Run the hooks for the executed query."""
+        conn = current_conn.get()
+        record = QueryRecord(
+            str(query),
+            None if self.redact_params else params,
+            perf_counter() - start,
+            rows,
+            replica=bool(conn and conn.read_only),
+        )
+        for hook in self.query_hooks:
+            hook(record)
+
+    async def execute(self, query: Any, *params, **options) -> Any:
+        if not self.query_hooks:
+            return await super().execute(query, *params, **options)
+
+        start, res = perf_counter(), None
+        try:
+            res = await super().execute(query, *params, **options)
+            return res
+        finally:
+            self.record(query, params, start, res[0] if isinstance(res, tuple) else None)
+
+    async def executemany(self, query: Any, *params, **options) -> Any:
+        if not self.query_hooks:
+            return await super().executemany(query, *params, **options)
+
+        start = perf_counter()
+        try:
+            return await super().executemany(query, *params, **options)
+        finally:
+            self.record(query, params, start)
+
+    async def fetchall(self, query: Any, *params, **options) -> Any:
+        if not self.query_hooks:
+            return await super().fetchall(query, *params, **options)
+
+        start, res = perf_counter(), None
+        try:
+            res = await super().fetchall(query, *params, **options)
+            return res
+        finally:
+            self.record(query, params, start, None if res is None else len(res))
+
+    async def fetchmany(self, size: int, query: Any, *params, **options) -> Any:
+        if not self.query_hooks:
+            return await super().fetchmany(size, query, *params, **options)
+
+        start, res = perf_counter(), None
+        try:
+            res = await super().fetchmany(size, query, *params, **options)
+            return res
+        finally:
+            self.record(query, params, start, None if res is None else len(res))
+
+    async def fetchone(self, query: Any, *params, **options) -> Any:
+        if not self.query_hooks:
+            return await super().fetchone(query, *params, **options)
+
+        start, res = perf_counter(), None
+        try:
+            res = await super().fetchone(query, *params, **options)
+            return res
+        finally:
+            self.record(query, params, start, int(res is not None))
+
+    async def fetchval(self, query: Any, *params, **options) -> Any:
+        if not self.query_hooks:
+            return await super().fetchval(query, *params, **options)
+
+        start = perf_counter()
+        try:
+            return await super().fetchval(query, *params, **options)
+        finally:
+            self.record(query, params, start)
+
+    async def iterate(self, query: Any, *params, **options) -> AsyncIterator:
+        if not self.query_hooks:
+            async for res in super().iterate(query, *params, **options):
+                yield res
+            return
+
+        start, rows = perf_counter(), 0
+        try:
+            async for res in super().iterate(query, *params, **options):
+                rows += 1
+                yield res
+        finally:
+            self.record(query, params, start, rows)
@@ -0,0 +1,112 @@
+"""Pluggable JSON codecs (orjson, msgspec, stdlib)."""
+
+from __future__ import annotations
+
+import json
+from contextlib import suppress
+from typing import TYPE_CHECKING, Any, Callable, NamedTuple
+
+if TYPE_CHECKING:
+    from .types import TJSONDump, TJSONLoad
+
+
+class StructCodec(NamedTuple):
+    """JSON encoder and validating decoder for a struct/dataclass type."""
+
+    dumps: Callable[[Any], str]
+    loads: Callable[[str | bytes], Any]
+    convert: Callable[[Any], Any]
+    to_builtins: Callable[[Any], Any]
+
+
+class JSONCodec(NamedTuple):
+    """JSON encoder and decoder.
+
+    The encoder returns strings (text columns and drivers expect them), the decoder accepts
+    both strings and bytes and raises ValueError for invalid documents.
+    """
+
+    name: str
+    dumps: TJSONDump
+    loads: TJSONLoad
+
+
+JSON_CODECS: dict[str, JSONCodec] = {"json": JSONCodec("json", json.dumps, json.loads)}
+
+with suppress(ImportError):
+    import orjson
+
+    orjson_option = orjson.OPT_NON_STR_KEYS
+
+    def orjson_dumps(obj: Any) -> str:
+        return orjson.dumps(obj, option=orjson_option).decode()
+
+    JSON_CODECS["orjson"] = JSONCodec("orjson", orjson_dumps, orjson.loads)
+
+with suppress(ImportError):
+    import msgspec
+
+    msgspec_encode = msgspec.json.Encoder().encode
+    msgspec_decode = msgspec.json.Decoder().decode
+
+    def msgspec_dumps(obj: Any) -> str:
+        return msgspec_encode(obj).decode()
+
+    def msgspec_loads(data: str | bytes) -> Any:
+        try:
+            return msgspec_decode(data)
+        except msgspec.DecodeError as exc:
+            raise ValueError(str(exc)) from exc
+
+    JSON_CODECS["msgspec"] = JSONCodec("msgspec", msgspec_dumps, msgspec_loads)
+
+
+def get_json_codec(name: str = "auto") -> JSONCodec:
+    """Get a JSON codec by name.
+
+    "auto" selects the fastest installed one: orjson, msgspec or stdlib json.
+    """
+    if name == "auto":
+        return JSON_CODECS.get("orjson") or JSON_CODECS.get("msgspec") or JSON_CODECS["json"]
+
+    codec = JSON_CODECS.get(name)
+    if codec is None:
+        raise ValueError(f"JSON codec is not available: {name!r}")
+
+    return codec
+
+
+def get_struct_codec(schema: type) -> StructCodec:
+    """Get a codec which decodes documents straight into the given struct/dataclass type.
+
+    Decoding errors (invalid documents and validation errors) are raised as ValueError.
+    """
+    if "msgspec" not in JSON_CODECS:
+        raise RuntimeError("Install msgspec to use typed JSON fields")
+
+    decode = msgspec.json.Decoder(schema).decode
+    decode_error = msgspec.DecodeError
+
+    def loads(data: str | bytes) -> Any:
+        try:
+            return decode(data)
+        except decode_error as exc:
+            raise ValueError(str(exc)) from exc
+
+    def convert(obj: Any) -> Any:
+        try:
+            return msgspec.convert(obj, schema)
+        except decode_error as exc:
+            raise ValueError(str(exc)) from exc
+
+    return StructCodec(msgspec_dumps, loads, convert, msgspec.to_builtins)
+
+
+async def init_asyncpg_json(codec: JSONCodec, conn: Any) -> Any:
+    """Setup asyncpg JSON codecs for the given connection."""
+    for name in ("json", "jsonb"):
+        await conn.set_type_codec(
+            name, encoder=codec.dumps, decoder=codec.loads, schema="pg_catalog"
+        )
+
+    return conn
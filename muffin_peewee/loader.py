@@ -0,0 +1,88 @@
+"""Batch relations loading (DataLoader)."""
+
+from __future__ import annotations
+
+import asyncio
+from contextlib import contextmanager
+from contextvars import ContextVar
+from typing import TYPE_CHECKING, Any
+
+if TYPE_CHECKING:
+    from collections.abc import Generator
+
+    import peewee as pw
+
+    from .manager import Manager
+
+current_loader: ContextVar[RelationLoader | None] = ContextVar("current_loader", default=None)
+
+
+class RelationLoader:
+    """Collect lookups by fields made in the same event loop iteration.
+
+    The lookups are merged into one `WHERE field IN (...)` query per field.
+    """
+
+    __slots__ = "batches", "manager", "tasks"
+
+    def __init__(self, manager: Manager):
+        self.manager = manager
+        self.batches: dict[tuple[pw.Field, bool], dict[Any, asyncio.Future]] = {}
+        self.tasks: set[asyncio.Task] = set()
+
+    def __repr__(self) -> str:
+        return f"<RelationLoader {len(self.batches)} pending>"
+
+    def load(self, field: pw.Field, value: Any, *, many: bool = False) -> asyncio.Future:
+        """Get a future for the instance (or the list of instances) with the field's value."""
+        key = (field, many)
+        batch = self.batches.get(key)
+        if batch is None:
+            batch = self.batches[key] = {}
+            # The task runs after the callers which are ready in this iteration
+            task = asyncio.create_task(self.dispatch(key))
+            self.tasks.add(task)
+            task.add_done_callback(self.tasks.discard)
+
+        value = field.db_value(value)
+        future = batch.get(value)
+        if future is None:
+            future = batch[value] = asyncio.get_running_loop().create_future()
+
+        return future
+
+    async def dispatch(self, key: tuple[pw.Field, bool]):
+        """Load the collected batch with one query."""
+        batch = self.batches.pop(key)
+        field, many = key
+        try:
+            query = field.model.select().where(field.in_(list(batch)))
+            rows = await self.manager.fetchall(query)
+        except Exception as exc:  # noqa: BLE001
+            for future in batch.values():
+                if not future.done():
+                    future.set_exception(exc)
+            return
+
+        results: dict[Any, Any] = {}
+        for row in rows:
+            value = field.db_value(row.__data__.get(field.name))
+            if many:
+                results.setdefault(value, []).append(row)
+            else:
+                results.setdefault(value, row)
+
+        for value, future in batch.items():
+            if not future.done():
+                future.set_result(results.get(value, [] if many else None))
+
+
+@contextmanager
+def loader_scope(manager: Manager) -> Generator[RelationLoader, None, None]:
+    """Batch relations loading in the context."""
+    loader = RelationLoader(manager)
+    token = current_loader.set(loader)
+    try:
+        yield loader
+    finally:
+        current_loader.reset(token)
@@ -0,0 +1,559 @@
+"""Database manager with support of deferred connections."""
+
+from __future__ import annotations
+
+import asyncio
+from contextlib import suppress
+from contextvars import ContextVar
+from functools import partial
+from typing import TYPE_CHECKING, Any, Callable, Self
+
+import peewee as pw
+from aio_databases.database import ConnectionContext, current_conn
+from peewee_aio.manager import Manager as AIOManager
+
+from .cache import get_write_table
+from .fields import Constructor
+from .identity import MISSING, current_identity, get_pk_lookup
+from .instrumentation import InstrumentedDatabase
+from .loader import current_loader
+from .replicas import ReplicasBalancer
+from .sqlite import setup_sqlite_writer
+
+if TYPE_CHECKING:
+    from collections.abc import AsyncIterator, Collection, Sequence
+    from contextvars import Token
+
+    from aio_databases.backends import ABCConnection, ABCDatabaseBackend, ABCTransaction
+    from peewee_aio.types import TVModel
+
+    from .bus import InvalidationBus
+    from .cache import QueryCache
+    from .identity import IdentityMap
+
+# The default maximum size of the pools (asyncpg, aiopg, aiomysql)
+DEFAULT_POOL_MAX_SIZE = 10
+
+current_lazy: ContextVar[LazyContext | None] = ContextVar("current_lazy", default=None)
+
+
+class Manager(AIOManager, InstrumentedDatabase):
+    """Peewee-AIO manager which supports lazy connections, replicas balancing and query hooks."""
+
+    def __init__(  # noqa: PLR0913
+        self,
+        url: str,
+        *,
+        replicas_weights: Sequence[float] | None = None,
+        replicas_max_lag: float | None = None,
+        replicas_health_timeout: float = 5.0,
+        sqlite_writer: bool = False,
+        sqlite_readers: int = 4,
+        **backend_options,
+    ):
+        """Initialize the manager and the replicas balancer."""
+        super().__init__(url, **backend_options)
+        self.sqlite_writer = sqlite_writer
+        if sqlite_writer:
+            setup_sqlite_writer(self, sqlite_readers)
+
+        self.balancer = ReplicasBalancer(
+            self.replica_backends,
+            weights=replicas_weights,
+            max_lag=replicas_max_lag,
+            timeout=replicas_health_timeout,
+        )
+
+        self.query_hooks = []
+        self.query_cache: QueryCache | None = None
+        self.bus: InvalidationBus | None = None
+
+        # Track the tables changed in transactions to invalidate them after the transactions
+        self.pending: dict[ABCConnection, set[str]] = {}
+        backend = self.backend
+        backend.connection_cls = get_tracked_connection_cls(self, backend.connection_cls)  # type: ignore[misc]
+
+        # Track acquired connections to drain them on shutdown
+        self.active: set[ABCConnection] = set()
+        self.draining = False
+        self._drained: asyncio.Event | None = None
+
+    async def connect(self) -> Self:
+        """Open the database's pool."""
+        self.draining = False
+        return await super().connect()
+
+    def connection(self, *, create: bool = True, **params) -> Any:
+        """Get/create a connection. Start a pending lazy connection if it's required.
+
+        The nested connections to the SQLite writer use the current one.
+        """
+        create = create and self.get_writer_conn() is None
+        lazy = current_lazy.get()
+        if create or lazy is None or lazy.started:
+            return self.track(super().connection(create=create, **params))
+
+        return DeferredContext(lazy, partial(super().connection, create=False, **params))
+
+    def transaction(self, *, create: bool = False, **params) -> Any:
+        """Create a transaction. Start a pending lazy connection if it's required.
+
+        The nested transactions to the SQLite writer use the current connection.
+        """
+        create = create and self.get_writer_conn() is None
+        lazy = current_lazy.get()
+        if create or lazy is None or lazy.started:
+            return self.track(super().transaction(create=create, **params))
+
+        return DeferredContext(lazy, partial(super().transaction, create=False, **params))
+
+    def replica(self, **params) -> Any:
+        """Get a read-only connection to a healthy replica (or to the primary if there are no)."""
+        return self.track(
+            ConnectionContext(
+                self.get_replica_backend(), use_existing=False, read_only=True, **params
+            )
+        )
+
+    def get_writer_conn(self) -> ABCConnection | None:
+        """Get the current connection to the SQLite writer (it's shared by nested contexts)."""
+        if not self.sqlite_writer:
+            return None
+
+        conn = current_conn.get()
+        if conn is None or conn.backend is not self.backend:
+            return None
+
+        return conn
+
+    def track(self, ctx: ConnectionContext) -> Any:
+        """Track the context if it creates a new connection."""
+        return TrackedContext(self, ctx) if ctx.create_conn else ctx
+
+    def acquired(self, conn: ABCConnection):
+        """Register an acquired connection."""
+        if self.draining:
+            raise RuntimeError("Database is draining, new connections are not allowed")
+
+        self.active.add(conn)
+
+    def released(self, conn: ABCConnection):
+        """Unregister a released connection."""
+        self.active.discard(conn)
+        self.pending.pop(conn, None)
+
+        if self._drained is not None and not self.active:
+            self._drained.set()
+
+    async def drain(self, timeout: float) -> int:  # noqa: ASYNC109
+        """Stop giving out new connections and wait for the active ones to be released.
+
+        Roll back and release the connections which are still active after the timeout.
+        Return the number of the force-closed connections.
+        """
+        self.draining = True
+        if self.active:
+            self._drained = drained = asyncio.Event()
+            with suppress(TimeoutError):
+                await asyncio.wait_for(drained.wait(), timeout)
+            self._drained = None
+
+        active = list(self.active)
+        for conn in active:
+            self.logger.warning("Force close the connection: %r", conn)
+            # Releasing commits on some backends, discard the unfinished transactions
+            for trans in sorted(conn.transactions, key=is_nested, reverse=True):
+                with suppress(Exception):
+                    await trans.rollback()
+
+            with suppress(Exception):
+                await conn.release()
+            self.released(conn)
+
+        return len(active)
+
+    def get_replica_backend(self) -> ABCDatabaseBackend:
+        """Choose a replica backend."""
+        if not self.replica_backends:
+            raise RuntimeError("No replicas configured for this database")
+
+        return self.balancer.choose() or self.backend
+
+    async def warmup(self, size: int, query: str | None = "SELECT 1"):
+        """Pre-open and validate connections to the primary and the replicas."""
+        await warmup(self.backend, size, query)
+        for backend in self.replica_backends:
+            try:
+                await warmup(backend, size, query)
+            except Exception:
+                backend.logger.warning("Replica warm-up failed: %r", backend, exc_info=True)
+
+    async def get_or_none(self, model_cls: type[TVModel], *args, **kwargs) -> TVModel | None:
+        """Get an instance.
+
+        Use the current identity map and relation loader for lookups by primary keys.
+        """
+        identity, loader = current_identity.get(), current_loader.get()
+        pk = (
+            MISSING
+            if identity is None and loader is None
+            else get_pk_lookup(model_cls, args, kwargs)
+        )
+        if pk is MISSING:
+            return await super().get_or_none(model_cls, *args, **kwargs)
+
+        inst = None if identity is None else identity.get(model_cls, pk)
+        if inst is None:
+            inst = await (
+                super().get_or_none(model_cls, *args, **kwargs)
+                if loader is None
+                else loader.load(model_cls._meta.primary_key, pk)  # type: ignore[attr-defined]
+            )
+            if inst is not None and identity is not None:
+                identity.add(inst)
+
+        return inst  # type: ignore[return-value]
+
+    async def execute(self, query: Any, *params, **opts) -> Any:
+        """Execute the query. Invalidate the identity map and the cache for changes."""
+        res = await super().execute(query, *params, **opts)
+        await self.changed(query)
+        return res
+
+    async def executemany(self, query: Any, *params, **opts) -> Any:
+        """Execute the query many times. Invalidate the cache for changes."""
+        res = await super().executemany(query, *params, **opts)
+        await self.changed(query)
+        return res
+
+    # Writes with RETURNING (inserts on PostgreSQL) fetch the results, so the fetching methods
+    # invalidate the cache too
+
+    async def fetchall(self, query: Any, *params, raw: bool = False, **opts) -> Any:
+        """Execute the query and fetch all."""
+        res = await super().fetchall(query, *params, raw=True, **opts)
+        await self.changed(query)
+        return get_constructor(query, raw=raw)(res)
+
+    async def fetchmany(self, size: int, query: Any, *params, raw: bool = False, **opts) -> Any:
+        """Execute the query and fetch many of the size."""
+        res = await super().fetchmany(size, query, *params, raw=True, **opts)
+        await self.changed(query)
+        return get_constructor(query, raw=raw)(res)
+
+    async def fetchone(self, query: Any, *params, raw: bool = False, **opts) -> Any:
+        """Execute the query and fetch one."""
+        res = await super().fetchone(query, *params, raw=True, **opts)
+        await self.changed(query)
+        return get_constructor(query, raw=raw)(res)
+
+    async def iterate(self, query: Any, *params, raw: bool = False, **opts) -> AsyncIterator:
+        """Execute the query and iterate through results."""
+        constructor = get_constructor(query, raw=raw)
+        try:
+            async for res in super().iterate(query, *params, raw=True, **opts):
+                yield constructor(res)
+        finally:
+            await self.changed(query)
+
+    async def fetchval(self, query: Any, *params, **opts) -> Any:
+        """Execute the query and fetch a value. Invalidate the cache for changes."""
+        res = await super().fetchval(query, *params, **opts)
+        await self.changed(query)
+        return res
+
+    async def changed(self, query: Any):
+        """Invalidate the identity map and the caches if the query changes a table."""
+        identity = current_identity.get()
+        if identity is not None:
+            forget_changed(identity, query)
+
+        if self.query_cache is None and self.bus is None:
+            return
+
+        table = get_write_table(query)
+        if table is not None:
+            await self.invalidate_tables({table})
+
+    async def invalidate_tables(self, tables: Collection[str]):
+        """Invalidate the cached results for the tables and publish the changes.
+
+        The tables changed in a transaction are invalidated again (the cache could be filled
+        with the old rows before the commit) and published when the transaction is finished.
+        """
+        if self.query_cache is not None:
+            await self.query_cache.backend.invalidate(tables)
+
+        conn = current_conn.get()
+        if conn is not None and conn.transactions:
+            self.pending.setdefault(conn, set()).update(tables)
+
+        elif self.bus is not None:
+            await self.bus.publish(tables)
+
+    async def finished(self, conn: ABCConnection, *, committed: bool):
+        """Process the tables changed in the connection's finished transaction.
+
+        Publish the committed changes only.
+        """
+        if conn.transactions:  # A nested transaction
+            return
+
+        tables = self.pending.pop(conn, None)
+        if not tables:
+            return
+
+        if self.query_cache is not None:
+            await self.query_cache.backend.invalidate(tables)
+
+        if committed and self.bus is not None:
+            self.bus.run(self.bus.publish(tables))
+
+    def lazy_connection(self, *, transaction: bool = False, replica: bool = False) -> LazyContext:
+        """Prepare a connection (and a transaction) which is acquired on the first query."""
+        if replica:
+            backend = self.get_replica_backend()
+            return LazyContext(self, backend.connection(read_only=True))
+
+        conn = self.get_writer_conn()
+        if conn is not None:
+            return LazyContext(self, conn, transaction=transaction, shared=True)
+
+        return LazyContext(self, self.backend.connection(), transaction=transaction)
+
+
+def get_constructor(query: Any, *, raw: bool) -> Callable:
+    """Get a results processor for the query (decode lazy JSON fields for non-model rows)."""
+    if raw or not isinstance(query, pw.BaseQuery):
+        return identity
+
+    return Constructor(query)
+
+
+def identity(res: Any) -> Any:
+    return res
+
+
+def forget_changed(identity: IdentityMap, query: Any):
+    """Discard the instances which could be changed by the query from the identity map.
+
+    Discard the changed instances for model updates and deletes, all the model's instances for
+    upserts and all the instances for the other writes (raw SQL, compiled queries).
+    """
+    if isinstance(query, (pw.ModelUpdate, pw.ModelDelete)):
+        model_cls, where = query.model, query._where
+        identity.discard(
+            model_cls, MISSING if where is None else get_pk_lookup(model_cls, (where,), {})
+        )
+
+    elif isinstance(query, pw.ModelInsert):
+        on_conflict = query._on_conflict
+        if on_conflict is not None and (on_conflict._action or "").upper() != "IGNORE":
+            identity.discard(query.model)
+
+    elif get_write_table(query) is not None:
+        identity.clear()
+
+
+def is_nested(trans: ABCTransaction) -> bool:
+    """Check if the transaction is a savepoint."""
+    if getattr(trans, "savepoint", None):
+        return True
+
+    # asyncpg
+    return bool(getattr(getattr(trans, "_trans", None), "_nested", False))
+
+
+def get_tracked_connection_cls(manager: Manager, connection_cls: type) -> type:
+    """Get a connection class which reports the finished transactions to the manager."""
+    transaction_cls = connection_cls.transaction_cls
+
+    class TrackedTransaction(transaction_cls):
+        __slots__ = ()
+
+        async def commit(self, **params):
+            res = await super().commit(**params)
+            await manager.finished(self.connection, committed=True)
+            return res
+
+        async def rollback(self, **params):
+            try:
+                return await super().rollback(**params)
+            finally:
+                await manager.finished(self.connection, committed=False)
+
+    class TrackedConnection(connection_cls):
+        __slots__ = ()
+        transaction_cls = TrackedTransaction
+
+    return TrackedConnection
+
+
+def get_max_connections(backend: ABCDatabaseBackend) -> int | None:
+    """Get the maximum number of the backend's connections (None if it's unlimited)."""
+    limit = getattr(backend, "max_connections", None)
+    if limit is not None:
+        return limit
+
+    options = getattr(backend, "pool_options", None)
+    if options is None:
+        return None
+
+    return options.get("max_size", options.get("maxsize", DEFAULT_POOL_MAX_SIZE))
+
+
+async def warmup(backend: ABCDatabaseBackend, size: int, query: str | None = None):
+    """Acquire the given number of connections at once, validate and return them to the pool.
+
+    The number is limited by the backend's maximum of connections (the pool's size).
+    """
+    limit = get_max_connections(backend)
+    if limit is not None:
+        size = min(size, limit)
+
+    conns = [backend.connection() for _ in range(size)]
+    try:
+        await asyncio.gather(*(conn.acquire() for conn in conns))
+        if query:
+            await asyncio.gather(*(conn.fetchval(query) for conn in conns))
+    finally:
+        await asyncio.gather(*(conn.release() for conn in conns))
+
+
+class LazyContext:
+    """Acquire a connection and start a transaction only when the first query is made."""
+
+    __slots__ = (
+        "_lock",
+        "conn",
+        "manager",
+        "shared",
+        "started",
+        "tokens",
+        "trans",
+        "transaction",
+    )
+
+    if TYPE_CHECKING:
+        tokens: tuple[Token, Token]
+
+    def __init__(
+        self,
+        manager: Manager,
+        conn: ABCConnection,
+        *,
+        transaction: bool = False,
+        shared: bool = False,
+    ):
+        self.manager = manager
+        self.conn = conn
+        self.transaction = transaction
+        self.shared = shared
+        self.trans: ABCTransaction | None = None
+        self.started = False
+        self._lock = asyncio.Lock()
+
+    async def __aenter__(self) -> Self:
+        self.tokens = current_conn.set(self.conn), current_lazy.set(self)
+        return self
+
+    async def __aexit__(self, exc_type, exc, tb):
+        conn_token, lazy_token = self.tokens
+        current_lazy.reset(lazy_token)
+        current_conn.reset(conn_token)
+        if not self.started:
+            return
+
+        if self.shared:
+            if self.trans is not None:
+                await self.trans.__aexit__(exc_type, exc, tb)
+            return
+
+        try:
+            try:
+                if self.trans is not None:
+                    await self.trans.__aexit__(exc_type, exc, tb)
+            finally:
+                await self.conn.release()
+        finally:
+            self.manager.released(self.conn)
+
+    async def start(self) -> ABCConnection:
+        """Acquire the connection and start the transaction."""
+        if not self.started:
+            async with self._lock:
+                if not self.started:
+                    await self.acquire()
+
+        return self.conn
+
+    async def acquire(self):
+        """Register and acquire the connection, start the transaction.
+
+        A shared connection is owned by the outer context, only start the transaction.
+        """
+        conn = self.conn
+        if self.shared:
+            if self.transaction:
+                self.trans = trans = conn.transaction()
+                await trans.start()
+            self.started = True
+            return conn
+
+        self.manager.acquired(conn)
+        try:
+            await conn.acquire()
+            if self.transaction:
+                self.trans = trans = conn.transaction()
+                await trans.start()
+        except BaseException:
+            with suppress(Exception):
+                await conn.release()
+            self.manager.released(conn)
+            raise
+
+        self.started = True
+
+        return self.conn
+
+
+class TrackedContext:
+    """Register the context's connection in the manager."""
+
+    __slots__ = "ctx", "manager"
+
+    def __init__(self, manager: Manager, ctx: ConnectionContext):
+        self.manager = manager
+        self.ctx = ctx
+
+    async def __aenter__(self):
+        self.manager.acquired(self.ctx.conn)
+        try:
+            return await self.ctx.__aenter__()
+        except BaseException:
+            self.manager.released(self.ctx.conn)
+            raise
+
+    async def __aexit__(self, *args):
+        try:
+            return await self.ctx.__aexit__(*args)
+        finally:
+            self.manager.released(self.ctx.conn)
+
+
+class DeferredContext:
+    """Start a lazy connection before entering the given context."""
+
+    __slots__ = "ctx", "factory", "lazy"
+
+    def __init__(self, lazy: LazyContext, factory: Callable[[], Any]):
+        self.lazy = lazy
+        self.factory = factory
+
+    async def __aenter__(self):
+        await self.lazy.start()
+        self.ctx = self.factory()
+        return await self.ctx.__aenter__()
+
+    async def __aexit__(self, *args):
+        return await self.ctx.__aexit__(*args)
@@ -0,0 +1,136 @@
+"""Keyset (seek) pagination."""
+
+from __future__ import annotations
+
+import binascii
+import json
+from base64 import urlsafe_b64decode, urlsafe_b64encode
+from functools import reduce
+from operator import and_, or_
+from typing import TYPE_CHECKING, Any, NamedTuple
+
+import peewee as pw
+
+if TYPE_CHECKING:
+    from collections.abc import Sequence
+
+    from .manager import Manager
+
+TOrdering = list[tuple[pw.Field, bool]]
+
+
+class Page(NamedTuple):
+    """A page of the query's results with cursors to the next and the previous pages."""
+
+    items: list[Any]
+    next: str | None
+    prev: str | None
+
+
+def get_ordering(model_cls: type[pw.Model], order_by: Sequence[Any]) -> TOrdering:
+    """Get the ordering fields with their directions (descending or not).
+
+    The primary key is added to make the ordering unique.
+    """
+    ordering = []
+    for node in order_by:
+        field, desc = (
+            (node.node, node.direction == "DESC")
+            if isinstance(node, pw.Ordering)
+            else (node, False)
+        )
+        if not isinstance(field, pw.Field):
+            raise TypeError(f"Keyset pagination supports ordering by fields only: {node!r}")
+        ordering.append((field, desc))
+
+    pk = model_cls._meta.primary_key
+    if pk and all(field is not pk for field, _ in ordering):
+        ordering.append((pk, ordering[-1][1] if ordering else False))
+
+    return ordering
+
+
+def encode_cursor(ordering: TOrdering, item: Any) -> str:
+    """Get an opaque cursor token for the item."""
+    data = item if isinstance(item, dict) else item.__data__
+    values = [field.db_value(data[field.name]) for field, _ in ordering]
+    payload = json.dumps(values, default=str, separators=(",", ":")).encode()
+    return urlsafe_b64encode(payload).rstrip(b"=").decode()
+
+
+def decode_cursor(ordering: TOrdering, cursor: str) -> list[Any]:
+    """Get the ordering fields values from the cursor token."""
+    try:
+        values = json.loads(urlsafe_b64decode(cursor + "=" * (-len(cursor) % 4)))
+    except (ValueError, binascii.Error) as exc:
+        raise ValueError(f"Invalid cursor: {cursor!r}") from exc
+
+    if not isinstance(values, list) or len(values) != len(ordering):
+        raise ValueError(f"Invalid cursor: {cursor!r}")
+
+    return [field.python_value(value) for (field, _), value in zip(ordering, values, strict=True)]
+
+
+def get_predicate(ordering: TOrdering, values: list[Any], *, forward: bool) -> pw.Expression:
+    """Get the condition to seek the rows after (or before) the given values."""
+    # Row values comparison is used when all the fields have the same direction (index-friendly)
+    directions = {desc for _, desc in ordering}
+    if len(directions) == 1:
+        after = forward != directions.pop()
+        lhs = pw.Tuple(*[field for field, _ in ordering])
+        rhs = pw.Tuple(
+            *[field.to_value(value) for (field, _), value in zip(ordering, values, strict=True)]
+        )
+        return lhs > rhs if after else lhs < rhs
+
+    conditions = []
+    for idx, (field, desc) in enumerate(ordering):
+        cond = field > values[idx] if forward != desc else field < values[idx]
+        equals = [f == v for (f, _), v in zip(ordering[:idx], values[:idx], strict=True)]
+        conditions.append(reduce(and_, equals, cond))
+
+    return reduce(or_, conditions)
+
+
+async def paginate(  # noqa: PLR0913
+    manager: Manager,
+    query: pw.ModelSelect,
+    *,
+    order_by: Sequence[Any],
+    after: str | None = None,
+    before: str | None = None,
+    limit: int = 20,
+) -> Page:
+    """Get a page of the query's results by keyset pagination.
+
+    The page starts after the `after` cursor or ends before the `before` cursor. The rows are
+    seeked by the ordering fields (which should be indexed and not nullable), so the cost of a
+    page doesn't depend on its depth.
+    """
+    if after and before:
+        raise ValueError("Use either after or before cursor")
+
+    ordering = get_ordering(query.model, order_by)
+    forward = before is None
+    cursor = after or before
+    if cursor:
+        query = query.where(
+            get_predicate(ordering, decode_cursor(ordering, cursor), forward=forward)
+        )
+
+    # Seek backward in the reversed order
+    query = query.order_by(
+        *[field.desc() if desc == forward else field.asc() for field, desc in ordering]
+    ).limit(limit + 1)
+    items = list(await manager.run(query))
+    has_more = len(items) > limit
+    items = items[:limit]
+    if not forward:
+        items.reverse()
+
+    first = encode_cursor(ordering, items[0]) if items else None
+    last = encode_cursor(ordering, items[-1]) if items else None
+    if forward:
+        return Page(items, last if has_more else None, first if cursor else None)
+
+    return Page(items, last, first if has_more else None)
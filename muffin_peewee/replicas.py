@@ -0,0 +1,145 @@
+"""Replicas health checking and load balancing."""
+
+from __future__ import annotations
+
+import asyncio
+from contextlib import suppress
+from random import choice, choices
+from time import perf_counter
+from typing import TYPE_CHECKING
+
+if TYPE_CHECKING:
+    from collections.abc import Sequence
+
+    from aio_databases.backends import ABCConnection, ABCDatabaseBackend
+
+# Queries to get replication lag in seconds
+LAG_QUERIES: dict[str, str] = {
+    "postgresql": (
+        "SELECT CASE WHEN pg_is_in_recovery() THEN "
+        "COALESCE(EXTRACT(EPOCH FROM now() - pg_last_xact_replay_timestamp()), 0) "
+        "ELSE 0 END"
+    ),
+}
+
+
+class Replica:
+    """Replica's state."""
+
+    __slots__ = "backend", "healthy", "lag", "latency", "weight"
+
+    def __init__(self, backend: ABCDatabaseBackend, weight: float | None = None):
+        self.backend = backend
+        self.weight = weight
+        self.healthy = True
+        self.lag: float | None = None
+        self.latency: float | None = None
+
+    def __repr__(self) -> str:
+        return f"<Replica {self.backend!r} healthy={self.healthy} lag={self.lag}>"
+
+    @property
+    def score(self) -> float:
+        """Get the replica's weight (configured or by measured latency)."""
+        if self.weight is not None:
+            return self.weight
+
+        if self.latency:
+            return 1 / max(self.latency, 1e-3)
+
+        return 1.0
+
+
+class ReplicasBalancer:
+    """Choose replicas by weights and exclude unavailable/lagging ones."""
+
+    def __init__(
+        self,
+        backends: Sequence[ABCDatabaseBackend],
+        *,
+        weights: Sequence[float] | None = None,
+        max_lag: float | None = None,
+        timeout: float = 5.0,
+    ):
+        if weights is not None and len(weights) != len(backends):
+            raise ValueError("Replicas weights should match the replicas")
+
+        self.replicas = [
+            Replica(backend, weights[idx] if weights else None)
+            for idx, backend in enumerate(backends)
+        ]
+        self.max_lag = max_lag
+        self.timeout = timeout
+        self.task: asyncio.Task | None = None
+
+    def choose(self) -> ABCDatabaseBackend | None:
+        """Choose a healthy replica. Return None if there are no available replicas."""
+        replicas = [replica for replica in self.replicas if replica.healthy]
+        if not replicas:
+            return None
+
+        if len(replicas) == 1:
+            return replicas[0].backend
+
+        weights = [replica.score for replica in replicas]
+        if not any(weights):
+            return choice(replicas).backend  # noqa: S311
+
+        return choices(replicas, weights)[0].backend  # noqa: S311
+
+    async def check(self, replica: Replica):
+        """Check replica's availability, latency and replication lag.
+
+        The replica is unavailable if the check isn't finished in the timeout.
+        """
+        backend = replica.backend
+        conn = backend.connection()
+        try:
+            await asyncio.wait_for(self.probe(replica, conn), self.timeout)
+
+        except Exception:
+            backend.logger.warning("Replica is unavailable: %r", backend, exc_info=True)
+            replica.healthy = False
+            return
+
+        finally:
+            with suppress(Exception):
+                await asyncio.wait_for(conn.release(), self.timeout)
+
+        max_lag = self.max_lag
+        replica.healthy = max_lag is None or replica.lag is None or replica.lag <= max_lag
+        if not replica.healthy:
+            backend.logger.warning("Replica is lagging (%.2fs): %r", replica.lag, backend)
+
+    async def probe(self, replica: Replica, conn: ABCConnection):
+        """Measure replica's latency and replication lag."""
+        await conn.acquire()
+        start = perf_counter()
+        await conn.fetchval("SELECT 1")
+        replica.latency = perf_counter() - start
+
+        query = LAG_QUERIES.get(replica.backend.db_type)
+        replica.lag = None if query is None else float(await conn.fetchval(query))
+
+    async def check_all(self):
+        """Check all the replicas."""
+        await asyncio.gather(*(self.check(replica) for replica in self.replicas))
+
+    async def monitor(self, interval: float):
+        """Check the replicas periodically."""
+        while True:
+            await self.check_all()
+            await asyncio.sleep(interval)
+
+    def start(self, interval: float):
+        """Start the health checking in background."""
+        if self.task is None and self.replicas:
+            self.task = asyncio.create_task(self.monitor(interval))
+
+    async def stop(self):
+        """Stop the health checking."""
+        task, self.task = self.task, None
+        if task is not None:
+            task.cancel()
+            with suppress(asyncio.CancelledError):
+                await task
@@ -0,0 +1,106 @@
+"""Stream query results into HTTP responses."""
+
+from __future__ import annotations
+
+import csv
+import io
+import json
+from typing import TYPE_CHECKING, Literal
+
+from muffin import ResponseStream
+
+from .bulk import batches, bulk_dump
+
+if TYPE_CHECKING:
+    from collections.abc import AsyncIterator
+
+    import peewee as pw
+
+    from .manager import Manager
+    from .types import TJSONDump
+
+TStreamFormat = Literal["ndjson", "json", "csv"]
+
+CONTENT_TYPES: dict[str, str] = {
+    "ndjson": "application/x-ndjson",
+    "json": "application/json",
+    "csv": "text/csv",
+}
+
+
+class ResponseQuery(ResponseStream):
+    """Stream the query's rows as NDJSON, a JSON array or CSV.
+
+    The rows are fetched in batches (from a server-side cursor on PostgreSQL) and every batch
+    is sent as a chunk: the next batch is fetched when the previous one is sent, so memory is
+    bounded by the batch size and slow clients throttle the database reads.
+
+    The response acquires its own connection (to a replica if replica is set) when it is sent,
+    or uses the current one when it is iterated inside a connection context.
+    """
+
+    def __init__(  # noqa: PLR0913
+        self,
+        manager: Manager,
+        query: pw.SelectBase,
+        *,
+        format: TStreamFormat = "ndjson",  # noqa: A002
+        batch_size: int = 1000,
+        dumps: TJSONDump = json.dumps,
+        replica: bool = False,
+        **kwargs,
+    ):
+        if format not in CONTENT_TYPES:
+            raise ValueError(f"Unsupported stream format: {format!r}")
+
+        kwargs.setdefault("content_type", CONTENT_TYPES[format])
+        super().__init__(
+            self.generate(manager, query, format, batch_size, dumps, replica=replica), **kwargs
+        )
+
+    @staticmethod
+    async def generate(  # noqa: PLR0913
+        manager: Manager,
+        query: pw.SelectBase,
+        format: TStreamFormat,  # noqa: A002
+        batch_size: int,
+        dumps: TJSONDump,
+        *,
+        replica: bool = False,
+    ) -> AsyncIterator[str]:
+        """Serialize the query's rows by batches."""
+        rows = bulk_dump(manager, query.dicts(), batch_size=batch_size)
+        async with (
+            manager.replica()
+            if replica and manager.current_conn is None
+            else manager.connection(create=False)
+        ):
+            if format == "ndjson":
+                async for batch in batches(rows, batch_size):
+                    yield "".join(f"{dumps(row)}\n" for row in batch)
+
+            elif format == "json":
+                sep = "["
+                async for batch in batches(rows, batch_size):
+                    yield sep + ",".join(dumps(row) for row in batch)
+                    sep = ","
+                yield "]" if sep == "," else "[]"
+
+            else:
+                buffer = io.StringIO()
+                writer = None
+                async for batch in batches(rows, batch_size):
+                    if writer is None:
+                        writer = csv.DictWriter(buffer, fieldnames=list(batch[0]))
+                        writer.writeheader()
+                    writer.writerows(batch)
+                    yield buffer.getvalue()
+                    buffer.seek(0)
+                    buffer.truncate()
+
+    async def stream_response(self, send):
+        """Stream the rows and close the cursor (even if the client has been disconnected)."""
+        try:
+            await super().stream_response(send)
+        finally:
+            await self.stream.aclose()
@@ -0,0 +1,143 @@
+"""Single writer and a pool of readers for SQLite."""
+
+from __future__ import annotations
+
+import asyncio
+from contextlib import suppress
+from typing import TYPE_CHECKING, Any
+
+if TYPE_CHECKING:
+    from .manager import Manager
+
+
+with suppress(ImportError):
+    from aio_databases.backends import AIOSQLiteBackend
+
+    class SQLiteWriterBackend(AIOSQLiteBackend):
+        """One persistent connection for all the writers.
+
+        The connections wait for the writer in a FIFO queue and hold it until they are released,
+        so the transactions never compete for the database's lock. The manager shares the current
+        connection with the nested contexts, acquiring the writer again in the task which holds it
+        raises RuntimeError.
+        """
+
+        max_connections = 1
+
+        def __init__(self, url, **options):
+            super().__init__(url, **options)
+            self.conn: Any = None
+            self.lock = asyncio.Lock()
+            self.owner: asyncio.Task | None = None
+
+        def __repr__(self) -> str:
+            return f"<SQLiteWriterBackend {'locked' if self.lock.locked() else 'idle'}>"
+
+        async def acquire(self) -> Any:
+            task = asyncio.current_task()
+            if self.owner is not None and self.owner is task:
+                raise RuntimeError("The SQLite writer is already acquired by the current task")
+
+            await self.lock.acquire()
+            self.owner = task
+            try:
+                if self.conn is None:
+                    conn = await super().acquire()
+                    await conn.execute("PRAGMA journal_mode = WAL")
+                    self.conn = conn
+            except BaseException:
+                self.owner = None
+                self.lock.release()
+                raise
+
+            return self.conn
+
+        async def release(self, conn):
+            try:
+                await conn.commit()
+            except Exception:
+                # Drop the broken connection, the next writer opens a new one
+                self.conn = None
+                with suppress(Exception):
+                    await conn.close()
+                raise
+            finally:
+                self.owner = None
+                self.lock.release()
+
+        async def disconnect(self):
+            await super().disconnect()
+            conn, self.conn = self.conn, None
+            if conn is not None:
+                await conn.close()
+
+    class SQLiteReaderBackend(AIOSQLiteBackend):
+        """A pool of persistent read-only connections."""
+
+        def __init__(self, url, *, size: int = 4, **options):
+            super().__init__(url, **options)
+            self.max_connections = size
+            self.opened = 0
+            self.idle: asyncio.Queue = asyncio.Queue()
+
+        def __repr__(self) -> str:
+            return f"<SQLiteReaderBackend {self.opened}/{self.max_connections}>"
+
+        async def acquire(self) -> Any:
+            if self.idle.empty() and self.opened < self.max_connections:
+                self.opened += 1
+                try:
+                    conn = await super().acquire()
+                    await conn.execute("PRAGMA query_only = ON")
+                except BaseException:
+                    self.opened -= 1
+                    raise
+
+                return conn
+
+            return await self.idle.get()
+
+        async def release(self, conn):
+            try:
+                if conn.in_transaction:
+                    await conn.rollback()
+            except Exception:
+                self.opened -= 1
+                with suppress(Exception):
+                    await conn.close()
+                raise
+
+            self.idle.put_nowait(conn)
+
+        async def disconnect(self):
+            await super().disconnect()
+            while not self.idle.empty():
+                conn = self.idle.get_nowait()
+                self.opened -= 1
+                with suppress(Exception):
+                    await conn.close()
+
+
+def setup_sqlite_writer(manager: Manager, readers: int = 4):
+    """Write through a single connection and read through a pool of reader connections.
+
+    The readers are used as the manager's replicas.
+    """
+    backend = manager.backend
+    if backend.name != "aiosqlite":
+        raise ValueError("SQLite writer mode requires aiosqlite backend")
+
+    if not backend._database:  # type: ignore[attr-defined]
+        raise ValueError("SQLite writer mode requires a database file")
+
+    if manager.replica_backends:
+        raise ValueError("SQLite writer mode doesn't support replicas")
+
+    params = dict(
+        backend.options,
+        init=backend.init,
+        logger=backend.logger,
+        convert_params=backend.convert_params,
+    )
+    manager.backend = SQLiteWriterBackend(backend.url, **params)
+    manager.replica_backends.append(SQLiteReaderBackend(backend.url, size=readers, **params))
@@ -1,6 +1,9 @@
-from typing import Any, Callable, TypeVar
+from collections.abc import Sequence
+from typing import Any, Callable, Literal, TypeVar
 
 TV = TypeVar("TV")
 TFactory = Callable[[], TV]
 TJSONDump = Callable[[Any], str]
 TJSONLoad = Callable[[str], Any]
+TPolicy = Literal["none", "connection", "transaction", "replica"]
+TJSONPath = str | int | Sequence[str | int]
@@ -1,7 +1,11 @@
+import asyncio
+
 import peewee
 import pytest
 
+from muffin_peewee.bus import PostgresTransport
 from muffin_peewee.fields import JSONAsyncPGField
+from muffin_peewee.json_codec import init_asyncpg_json
 
 
 @pytest.fixture
@@ -17,6 +21,7 @@ async def test_asyncpg_json_field(db):
 
     assert Test.json.field_type == "JSON"
     assert isinstance(Test.json, JSONAsyncPGField)
+    assert db.manager.backend.init.func is init_asyncpg_json
     assert Test.json.db_value({"key": "value"}) == {"key": "value"}
     assert Test.json.python_value({"key": "value"}) == {"key": "value"}
     assert Test.json.python_value('{"key": "value"}') == '{"key": "value"}'
@@ -29,3 +34,19 @@ async def test_asyncpg_json_field(db):
     assert isinstance(instance.json, dict)
 
     await Test.drop_table()
+
+
+async def test_postgres_transport(db):
+    received = []
+    async with db:
+        transport = PostgresTransport(db.manager)
+        await transport.start(received.append)
+        await transport.publish(b'{"tables": ["item"]}')
+        for _ in range(100):
+            if received:
+                break
+            await asyncio.sleep(0.01)
+
+        await transport.stop()
+
+    assert received == [b'{"tables": ["item"]}']
@@ -1,11 +1,16 @@
 from __future__ import annotations
 
+import asyncio
+import sqlite3
 from typing import TYPE_CHECKING
+from unittest import mock
 
 import peewee
+import pytest
 from peewee_aio import AIOModel
 
 import muffin_peewee
+from muffin_peewee.manager import DEFAULT_POOL_MAX_SIZE, Manager, get_max_connections
 
 if TYPE_CHECKING:
     from muffin import Application
@@ -57,3 +62,61 @@ async def test_conftest_without_setup_db(app: Application):
     db = muffin_peewee.Plugin(app, pytest_setup_db=False)
     async with db.conftest() as plugin:
         assert plugin is db
+
+
+async def test_startup_warmup_connections(app: Application, tmp_path):
+    db = muffin_peewee.Plugin(
+        app,
+        connection=f"aiosqlite:///{tmp_path / 'db.sqlite'}",
+        replicas=[f"aiosqlite:///{tmp_path / 'replica.sqlite'}"],
+        warmup_connections=3,
+    )
+    backend = db.manager.backend
+    replica = db.manager.replica_backends[0]
+
+    with (
+        mock.patch.object(backend, "acquire", wraps=backend.acquire) as acquire,
+        mock.patch.object(replica, "_acquire", side_effect=OSError),
+    ):
+        await db.startup()
+
+    assert acquire.await_count == 3
+    await db.shutdown()
+
+    # The warm-up is limited by the pool's size
+    with (
+        mock.patch.object(backend, "pool_options", {"max_size": 2}, create=True),
+        mock.patch.object(backend, "acquire", wraps=backend.acquire) as acquire,
+        mock.patch.object(replica, "_acquire", side_effect=OSError),
+    ):
+        await asyncio.wait_for(db.startup(), 1)
+
+    assert acquire.await_count == 2
+    await db.shutdown()
+
+    db.cfg.update(warmup_query="SELECT unknown")
+    with pytest.raises(sqlite3.OperationalError):
+        await db.startup()
+
+
+def test_max_connections():
+    assert get_max_connections(Manager("aiosqlite:///:memory:").backend) is None
+    assert get_max_connections(Manager("asyncpg+pool://localhost/db", max_size=3).backend) == 3
+    assert (
+        get_max_connections(Manager("aiopg+pool://localhost/db").backend) == DEFAULT_POOL_MAX_SIZE
+    )
+
+
+def test_pool_min_size(app: Application):
+    db = muffin_peewee.Plugin(app, connection="aiosqlite:///:memory:", pool_min_size=2)
+    assert "minsize" not in db.manager.backend.options
+
+    with mock.patch("muffin_peewee.Manager") as manager:
+        muffin_peewee.Plugin(
+            app,
+            connection="aiopg+pool://localhost/db",
+            pool_min_size=2,
+            migrations_enabled=False,
+        )
+
+    assert manager.call_args.kwargs["minsize"] == 2
@@ -0,0 +1,137 @@
+from __future__ import annotations
+
+from typing import TYPE_CHECKING
+from unittest import mock
+
+import peewee
+import pytest
+
+from muffin_peewee.bulk import PARAMS_LIMITS, get_batch_size
+from muffin_peewee.manager import Manager
+
+if TYPE_CHECKING:
+    from aio_databases.backends import ABCTransaction
+    from peewee_aio import AIOModel
+
+    from muffin_peewee import Plugin, QueryRecord
+
+
+async def test_bulk_load_dump(db: Plugin, transaction: ABCTransaction, model_cls: type[AIOModel]):
+    @db.register
+    class Item(model_cls):  # type: ignore[valid-type,misc]
+        name = peewee.CharField()
+        value = peewee.IntegerField(default=0)
+        meta = db.JSONField({})
+
+    await Item.create_table()
+
+    assert await db.bulk_load(Item, [{"name": "a", "value": 1, "meta": {"key": "a"}}]) == 1
+    assert await db.bulk_load(Item, [("b", 2, {"key": "b"}), ("c", 3, {})]) == 2
+    assert await db.bulk_load(Item, [Item(name="d", value=4)], batch_size=1) == 1
+
+    async def generate():
+        for idx in range(5):
+            yield {"name": f"gen-{idx}"}
+
+    assert await db.bulk_load(Item, generate(), batch_size=2) == 5
+    assert await Item.select().count() == 9
+
+    items = [item async for item in db.bulk_dump(Item.select().order_by(Item.id), batch_size=2)]
+    assert [item.name for item in items] == [
+        "a",
+        "b",
+        "c",
+        "d",
+        *(f"gen-{idx}" for idx in range(5)),
+    ]
+    assert items[0].meta == {"key": "a"}
+    assert items[4].value == 0
+    assert items[4].meta == {}
+
+    query = Item.select(Item.name, Item.value).where(Item.value > 1).order_by(Item.id).tuples()
+    assert [row async for row in db.bulk_dump(query)] == [("b", 2), ("c", 3), ("d", 4)]
+
+    # Stream on a read-only (replica) connection, the cursor isn't a repeated query
+    queries: list[QueryRecord] = []
+    db.on_query(queries.append)
+    conn = db.manager.current_conn
+    conn.read_only = True
+    try:
+        rows = [row async for row in db.bulk_dump(query, batch_size=1)]
+    finally:
+        conn.read_only = False
+
+    assert rows == [("b", 2), ("c", 3), ("d", 4)]
+    assert not [query for query in queries if query.sql.startswith(("DECLARE", "FETCH"))]
+
+    await Item.drop_table()
+
+
+async def test_insert_many_batched(
+    db: Plugin, transaction: ABCTransaction, model_cls: type[AIOModel]
+):
+    @db.register
+    class Item(model_cls):  # type: ignore[valid-type,misc]
+        name = peewee.CharField(unique=True)
+        value = peewee.IntegerField(default=0)
+
+    await Item.create_table()
+
+    queries: list[QueryRecord] = []
+    db.on_query(queries.append)
+
+    rows = ({"name": f"item-{idx}", "value": idx} for idx in range(5))
+    assert await db.insert_many_batched(Item, rows, batch_size=2) == 5
+    assert len([query for query in queries if query.sql.startswith("INSERT")]) == 3
+    assert await Item.select().count() == 5
+
+    # Upsert
+    rows = [{"name": "item-0", "value": 10}, {"name": "new", "value": 11}]
+    await db.insert_many_batched(
+        Item,
+        rows,
+        on_conflict={"conflict_target": [Item.name], "preserve": [Item.value]},
+    )
+    assert await Item.select().count() == 6
+    assert (await Item.get(name="item-0")).value == 10
+
+    # The batches are sized with the parameters of the conflict clause
+    queries.clear()
+    with mock.patch.dict(PARAMS_LIMITS, dict.fromkeys(PARAMS_LIMITS, 4)):
+        rows = [("item-0", 0), ("a", 0), ("b", 0)]
+        await db.insert_many_batched(
+            Item,
+            rows,
+            on_conflict={"conflict_target": [Item.name], "update": {Item.value: 5}},
+        )
+    assert len([query for query in queries if query.sql.startswith("INSERT")]) == 3
+    assert (await Item.get(name="item-0")).value == 5
+
+    await db.insert_many_batched(Item, [("item-1", 20), ("other", 21)], on_conflict="ignore")
+    assert await Item.select().count() == 9
+    assert (await Item.get(name="item-1")).value == 1
+
+    # A transaction per batch
+    rows = [("first", 0), ("second", 0), ("item-2", 0)]
+    with pytest.raises(peewee.IntegrityError):
+        await db.insert_many_batched(Item, rows, batch_size=2, transaction="batch")
+
+    assert await Item.select().where(Item.name.in_(["first", "second"])).count() == 2
+
+    await Item.drop_table()
+
+
+@pytest.mark.parametrize(
+    ("url", "limit"),
+    [
+        ("asyncpg://localhost/tests", 32767),
+        ("asyncpg+pool://localhost/tests", 32767),
+        ("aiopg://localhost/tests", 65535),
+        ("aiosqlite:///:memory:", PARAMS_LIMITS["sqlite"]),
+    ],
+)
+def test_batch_size_limits(url: str, limit: int):
+    manager = Manager(url)
+    for width in (1, 2, 7):
+        size = get_batch_size(manager, width, 3)
+        assert size * width + 3 <= limit < (size + 1) * width + 3
@@ -0,0 +1,300 @@
+from __future__ import annotations
+
+import asyncio
+from typing import TYPE_CHECKING
+from unittest import mock
+
+import muffin
+import peewee
+import pytest
+
+import muffin_peewee
+from muffin_peewee import PostgresTransport, SocketTransport
+from muffin_peewee.cache import MISSING, LRUCacheBackend, get_write_table
+
+if TYPE_CHECKING:
+    from aio_databases.backends import ABCTransaction
+    from peewee_aio import AIOModel
+
+    from muffin_peewee import Plugin
+
+
+@pytest.mark.parametrize(
+    ("sql", "table"),
+    [
+        ('INSERT INTO "item" ("name") VALUES (?)', "item"),
+        ("insert or replace into item values (1)", "item"),
+        ('UPDATE "public"."item" SET "name" = $1', "item"),
+        ("DELETE FROM `item` WHERE 1", "item"),
+        ("TRUNCATE TABLE item", "item"),
+        ('SELECT * FROM "item"', None),
+    ],
+)
+def test_get_write_table(sql, table):
+    assert get_write_table(sql) == table
+
+
+async def test_lru_backend():
+    backend = LRUCacheBackend(maxsize=2)
+    await backend.set("a", 1, ttl=0, tables={"t1"})
+    await backend.set("b", 2, ttl=0, tables={"t2"})
+    assert await backend.get("a") == 1
+
+    await backend.set("c", 3, ttl=-1, tables={"t1", "t2"})
+    assert await backend.get("b") is MISSING
+    assert await backend.get("c") is MISSING
+
+    await backend.set("c", 3, ttl=0, tables={"t2"})
+    await backend.invalidate({"t1"})
+    assert await backend.get("a") is MISSING
+    assert await backend.get("c") == 3
+
+    await backend.clear()
+    assert await backend.get("c") is MISSING
+
+
+async def test_cached(db: Plugin, transaction: ABCTransaction, model_cls: type[AIOModel]):
+    @db.register
+    class Category(model_cls):  # type: ignore[valid-type,misc]
+        name = peewee.CharField()
+
+    @db.register
+    class Item(model_cls):  # type: ignore[valid-type,misc]
+        name = peewee.CharField()
+        category = peewee.ForeignKeyField(Category)
+
+    await db.manager.create_tables(Category, Item)
+    category = await Category.create(name="books")
+    await Item.create(name="a", category=category)
+
+    query = Item.select(Item, Category).join(Category).where(Item.name != "").order_by(Item.id)
+    items = await db.cached(query)
+    assert [(item.name, item.category.name) for item in items] == [("a", "books")]
+
+    items = await db.cached(query)
+    assert [(item.name, item.category.name) for item in items] == [("a", "books")]
+
+    cache = db.manager.query_cache
+    assert cache
+    assert (cache.hits, cache.misses) == (1, 1)
+
+    # Invalidate by the joined table
+    await Category.update(name="comics")
+    items = await db.cached(query)
+    assert items[0].category.name == "comics"
+    assert (cache.hits, cache.misses) == (1, 2)
+
+    await Item.create(name="b", category=category)
+    assert [item.name for item in await db.cached(query)] == ["a", "b"]
+
+    # Writes with RETURNING (inserts on PostgreSQL)
+    with mock.patch.object(cache.backend, "invalidate", wraps=cache.backend.invalidate) as inv:
+        await Item.insert(name="c", category=category).returning(Item.id)
+        assert [item.name for item in await db.cached(query)] == ["a", "b", "c"]
+
+        await Category.update(name="novels").returning(Category.id)
+        assert (await db.cached(query))[0].category.name == "novels"
+
+        await Item.delete().where(Item.name == "c").returning(Item.id)
+        assert [item.name for item in await db.cached(query)] == ["a", "b"]
+
+    assert [call.args[0] for call in inv.await_args_list] == [{"item"}, {"category"}, {"item"}]
+
+    assert await db.cached(Category.select().dicts()) == [{"id": category.id, "name": "novels"}]
+    assert await db.cached(Category.select().where(Category.id == 0)) == []
+
+    await db.manager.drop_tables(Item, Category)
+
+
+async def test_cached_transaction(tmp_path):
+    app = muffin.Application("cache", PEEWEE_CONNECTION=f"aiosqlite:///{tmp_path / 'db.sqlite'}")
+    db = muffin_peewee.Plugin(app)
+
+    @db.register
+    class Item(db.Model):
+        name = peewee.CharField()
+
+    async def names():
+        async with db.connection():
+            return [item.name for item in await db.cached(Item.select())]
+
+    async with db, db.connection():
+        await Item.create_table()
+        await Item.create(name="old")
+
+    async with db, db.connection():
+        assert await names() == ["old"]
+        async with db.transaction():
+            await Item.update(name="new")
+            # Another connection caches the committed rows
+            assert await asyncio.create_task(names()) == ["old"]
+
+        # The tables are invalidated after the commit
+        assert await names() == ["new"]
+
+        async with db.transaction() as trans:
+            await Item.update(name="other")
+            # The transaction reads its own changes without caching them for the others
+            assert [item.name for item in await db.cached(Item.select())] == ["other"]
+            assert await asyncio.create_task(names()) == ["new"]
+            await trans.rollback()
+
+        # And after the rollback
+        assert await names() == ["new"]
+
+
+async def test_invalidation_bus(tmp_path):
+    async def setup(name):
+        app = muffin.Application(
+            name,
+            PEEWEE_CONNECTION=f"aiosqlite:///{tmp_path / 'db.sqlite'}",
+            PEEWEE_INVALIDATION_TRANSPORT=SocketTransport(tmp_path / "bus"),
+        )
+        db = muffin_peewee.Plugin(app)
+
+        @db.register
+        class Item(db.Model):
+            name = peewee.CharField()
+
+        await db.startup()
+        return db, Item
+
+    db1, item1_cls = await setup("worker1")
+    db2, item2_cls = await setup("worker2")
+
+    changes = []
+    db2.on_invalidate(changes.append)
+
+    async with db1.connection():
+        await item1_cls.create_table()
+
+    async with db2.connection():
+        assert await db2.cached(item2_cls.select()) == []
+
+    async def wait(count):
+        for _ in range(100):
+            if len(changes) >= count:
+                return
+            await asyncio.sleep(0.01)
+        raise AssertionError
+
+    # The changes are published after the transaction
+    async with db1.connection(), db1.transaction():
+        await item1_cls.create(name="a")
+        await asyncio.sleep(0.05)
+        assert not changes
+
+    await wait(1)
+    assert changes == [{"item"}]
+
+    # Rolled back changes are not published, a connection publishes after every commit
+    async with db1.connection():
+        async with db1.transaction() as trans:
+            await item1_cls.create(name="b")
+            await trans.rollback()
+
+        await asyncio.sleep(0.05)
+        assert len(changes) == 1
+
+        async with db1.transaction():
+            await item1_cls.update(name="a")
+
+        await wait(2)
+        assert changes == [{"item"}, {"item"}]
+
+    async with db2.connection():
+        assert [item.name for item in await db2.cached(item2_cls.select())] == ["a"]
+
+    async with db1.connection():
+        await item1_cls.delete()
+
+    await wait(3)
+    async with db2.connection():
+        assert await db2.cached(item2_cls.select()) == []
+
+    await db1.shutdown()
+    await db2.shutdown()
+    assert not list((tmp_path / "bus").glob("*.sock"))
+
+
+async def test_socket_transport_drops(tmp_path):
+    sender, receiver = SocketTransport(tmp_path), SocketTransport(tmp_path)
+    await receiver.start(lambda _: None)
+
+    with (
+        mock.patch.object(sender, "sock") as sock,
+        mock.patch.object(sender, "logger") as logger,
+    ):
+        sock.sendto.side_effect = BlockingIOError
+        await sender.publish(b"message")
+
+    assert sender.dropped == 1
+    logger.warning.assert_called_once()
+
+    await receiver.stop()
+    await sender.stop()
+
+
+async def test_postgres_transport_reconnect():
+    app = muffin.Application(
+        "postgres",
+        PEEWEE_CONNECTION="asyncpg://localhost/tests",
+        PEEWEE_INVALIDATION_TRANSPORT="postgres",
+    )
+    db = muffin_peewee.Plugin(app)
+
+    @db.register
+    class Item(db.Model):
+        name = peewee.CharField()
+
+    bus = db.manager.bus
+    assert bus
+    transport = bus.transport
+    assert isinstance(transport, PostgresTransport)
+
+    conns: list[mock.MagicMock] = []
+
+    def connection():
+        conn = mock.MagicMock(acquire=mock.AsyncMock(), release=mock.AsyncMock())
+        conn._conn.add_listener = mock.AsyncMock()
+        # The first reconnect fails
+        if len(conns) == 1:
+            conn.acquire.side_effect = OSError
+        conns.append(conn)
+        return conn
+
+    messages: list[bytes] = []
+    changes: list[set[str]] = []
+    db.on_invalidate(changes.append)
+
+    with (
+        mock.patch.object(db.manager.backend, "connection", side_effect=connection),
+        mock.patch.object(transport, "logger") as logger,
+    ):
+        await transport.start(messages.append)
+        conn = conns[0]
+        notify = conn._conn.add_listener.call_args.args[1]
+        notify(None, 1, transport.channel, "message")
+        assert messages == [b"message"]
+
+        # Lose the connection
+        transport.terminated(conn._conn)
+        assert transport.conn is None
+        with pytest.raises(RuntimeError, match="not connected"):
+            await transport.publish(b"message")
+
+        task = transport.task
+        assert task
+        await asyncio.wait_for(task, 1)
+
+        assert len(conns) == 3
+        assert transport.conn is conns[2]
+        conn.release.assert_awaited_once()
+        conns[2]._conn.add_listener.assert_awaited_once()
+        (tables,) = changes
+        assert "item" in tables
+        assert logger.warning.call_count == 3
+
+        await transport.stop()
+        conns[2]._conn.remove_termination_listener.assert_called_once_with(transport.terminated)
+        conns[2].release.assert_awaited_once()
@@ -0,0 +1,87 @@
+from __future__ import annotations
+
+from enum import Enum
+from typing import TYPE_CHECKING
+
+import peewee
+
+import muffin_peewee
+from muffin_peewee.compiled import SQLCache
+from muffin_peewee.fields import StrEnumField
+
+if TYPE_CHECKING:
+    from aio_databases.backends import ABCTransaction
+    from peewee_aio import AIOModel
+
+    from muffin_peewee import Plugin
+
+
+class Status(str, Enum):
+    active = "active"
+    blocked = "blocked"
+
+
+async def test_compiled(db: Plugin, transaction: ABCTransaction, model_cls: type[AIOModel]):
+    @db.register
+    class Item(model_cls):  # type: ignore[valid-type,misc]
+        name = peewee.CharField()
+        status = StrEnumField(Status, default=Status.active)
+
+    await Item.create_table()
+    await db.bulk_load(Item, [("a", Status.active), ("b", Status.blocked), ("c", Status.active)])
+
+    @db.compiled
+    def get_items(status, limit=10):
+        return Item.select().where(Item.status == status).order_by(Item.id).limit(limit)
+
+    @db.compiled
+    def block(name):
+        return Item.update(status=Status.blocked).where(Item.name == name)
+
+    items = await get_items(Status.active)
+    assert [item.name for item in items] == ["a", "c"]
+    assert items[0].status is Status.active
+
+    assert [item.name for item in await get_items(Status.active, limit=1)] == ["a"]
+
+    await block("c")
+    assert [item.name for item in await get_items(status=Status.blocked)] == ["b", "c"]
+
+    cache = db.sql_cache
+    assert cache.misses == 2
+    assert cache.hits == 2
+    assert cache.hit_rate == 0.5
+    assert "get_items" in repr(get_items)
+
+    cache.clear()
+    assert not cache.entries
+    assert cache.hit_rate == 0
+
+    await Item.drop_table()
+
+
+async def test_compiled_deferred_setup(app, tmp_path):
+    db = muffin_peewee.Plugin()
+
+    @db.compiled
+    def get_value(value):
+        return peewee.Select(columns=[peewee.Value(value).alias("value")]).dicts()
+
+    db.setup(app, connection=f"aiosqlite:///{tmp_path / 'db.sqlite'}")
+    queries = []
+    db.on_query(queries.append)
+
+    async with db, db.connection():
+        assert await get_value(1) == [{"value": 1}]
+
+    # The plugin's manager is used
+    assert len(queries) == 1
+
+
+def test_sql_cache_size(db: Plugin):
+    cache = SQLCache(maxsize=2)
+    builders = [lambda value: peewee.Select(columns=[peewee.Value(value)]) for _ in range(3)]
+    for builder in builders:
+        cache.get(builder, db.manager)
+
+    assert list(cache.entries) == builders[1:]
@@ -1,14 +1,18 @@
 from __future__ import annotations
 
 import datetime as dt
+import json
 import uuid
+from dataclasses import dataclass
 from enum import Enum
 from typing import TYPE_CHECKING, Type
 
+import msgspec
 import peewee
 import pendulum
 import pytest
 
+import muffin_peewee
 from muffin_peewee import (
     Choices,
     IntEnumField,
@@ -17,7 +21,15 @@ from muffin_peewee import (
     StrEnumField,
     URLField,
 )
-from muffin_peewee.fields import DateTimeTZField, JSONLikeField, JSONSQLiteField
+from muffin_peewee.fields import (
+    DateTimeTZField,
+    JSONLikeField,
+    JSONSQLiteField,
+    JSONStructLikeField,
+    JSONStructSQLiteField,
+    RawJSON,
+)
+from muffin_peewee.json_codec import JSON_CODECS, get_json_codec
 
 if TYPE_CHECKING:
     from aio_databases.backends import ABCTransaction
@@ -69,6 +81,194 @@ async def test_json_field_defaults_are_independent(db: Plugin):
     assert id(f1.default) != id(f2.default)
 
 
+@pytest.mark.parametrize("name", list(JSON_CODECS))
+def test_json_codecs(name):
+    codec = get_json_codec(name)
+    assert codec.name == name
+
+    data = codec.dumps({"key": [1, "é", None]})
+    assert isinstance(data, str)
+    assert codec.loads(data) == {"key": [1, "é", None]}
+    assert codec.loads(data.encode()) == {"key": [1, "é", None]}
+
+    with pytest.raises(ValueError):  # noqa: PT011
+        codec.loads("{invalid")
+
+
+def test_json_codec_auto():
+    assert get_json_codec().name == next(
+        name for name in ("orjson", "msgspec", "json") if name in JSON_CODECS
+    )
+
+    with pytest.raises(ValueError, match="JSON codec is not available"):
+        get_json_codec("unknown")
+
+
+def test_json_field_codec(app):
+    db = muffin_peewee.Plugin(app, json_codec="json")
+    field = db.JSONField({})
+    assert field._json_dumps is json.dumps
+    assert field._json_loads is json.loads
+
+    with pytest.raises(ValueError, match="JSON codec is not available"):
+        db.setup(app, json_codec="unknown")
+
+
+async def test_json_field_lazy(app, tmp_path):
+    db = muffin_peewee.Plugin(
+        app, connection=f"aiosqlite:///{tmp_path / 'db.sqlite'}", json_lazy=True
+    )
+
+    @db.register
+    class Test(db.Model):
+        data = peewee.CharField()
+        json = db.JSONField({})
+
+    assert Test.json.lazy
+
+    async with db, db.connection():
+        await db.create_tables()
+        await Test.create(data="some", json={"key": "value"})
+
+        instance = await Test.get()
+        raw = instance.__data__["json"]
+        assert isinstance(raw, RawJSON)
+        assert raw.decode() == {"key": "value"}
+
+        # Untouched documents are written back as is
+        assert Test.json.db_value(raw) is raw.data
+        instance.data = "other"
+        await instance.save()
+
+        instance = await Test.get()
+        assert instance.json == {"key": "value"}
+        assert instance.__data__["json"] == {"key": "value"}
+
+        instance.json["key"] = "other"
+        await instance.save()
+        instance = await Test.get()
+        assert instance.data == "other"
+        assert instance.json == {"key": "other"}
+
+        # Non-model rows are decoded eagerly
+        assert await Test.select(Test.json).dicts() == [{"json": {"key": "other"}}]
+        assert await Test.select(Test.json).tuples() == [({"key": "other"},)]
+        (row,) = await Test.select(Test.json.alias("doc")).namedtuples()
+        assert row.doc == {"key": "other"}
+        async for row in Test.select(Test.data, Test.json).dicts():
+            assert row == {"data": "other", "json": {"key": "other"}}
+
+
+def test_json_like_field_lazy():
+    field = JSONLikeField(lazy=True)
+    value = field.python_value('{"key": "value"}')
+    assert isinstance(value, RawJSON)
+    assert value.decode() == {"key": "value"}
+    assert field.db_value(value) == '{"key": "value"}'
+    assert field.python_value(None) is None
+
+
+async def test_json_field_path(app, tmp_path):
+    db = muffin_peewee.Plugin(app, connection=f"aiosqlite:///{tmp_path / 'db.sqlite'}")
+
+    @db.register
+    class Test(db.Model):
+        data = db.JSONField({})
+
+    async with db, db.connection():
+        await db.create_tables()
+        await Test.create(data={"user": {"name": "John", "tags": ["a", "b"]}, "count": 1})
+
+        await Test.update({Test.data: Test.data.set_path(("user", "name"), "Jane")})
+        await Test.update({Test.data: Test.data.set_path("count", {"value": 2})})
+        await Test.update({Test.data: Test.data.set_path(("user", "tags", 1), "c")})
+
+        instance = await Test.get()
+        assert instance.data == {
+            "user": {"name": "Jane", "tags": ["a", "c"]},
+            "count": {"value": 2},
+        }
+
+        query = Test.select(Test.data.get_path(("user", "name")).alias("name"))
+        assert await query.scalar() == "Jane"
+        assert await Test.select().where(Test.data.get_path(["count", "value"]) == 2).count() == 1
+
+
+def test_json_field_path_sql():
+    class Test(peewee.Model):
+        pg = JSONPGField()
+        text = JSONLikeField()
+
+    query = peewee.PostgresqlDatabase(None).get_sql_context()
+    assert query.sql(Test.pg.get_path(("user", 0))).query() == ('"t1"."pg"#>>\'{user,0}\'', [])
+
+    query = peewee.PostgresqlDatabase(None).get_sql_context()
+    assert query.sql(Test.pg.set_path(("user", "name"), "Jane")).query() == (
+        'CAST(jsonb_set(CAST("t1"."pg" AS jsonb), CAST(%s AS text[]), CAST(%s AS jsonb)) AS json)',
+        [["user", "name"], '"Jane"'],
+    )
+
+    query = peewee.MySQLDatabase(None).get_sql_context()
+    assert query.sql(Test.text.get_path("user")).query() == (
+        "JSON_UNQUOTE(JSON_EXTRACT(`t1`.`text`, %s))",
+        ['$."user"'],
+    )
+
+    query = peewee.MySQLDatabase(None).get_sql_context()
+    assert query.sql(Test.text.set_path(("user", 1), [1])).query() == (
+        "JSON_SET(`t1`.`text`, %s, JSON_EXTRACT(%s, %s))",
+        ['$."user"[1]', "[1]", "$"],
+    )
+
+
+class Settings(msgspec.Struct):
+    theme: str = "light"
+    tags: list[str] = msgspec.field(default_factory=list)
+
+
+@dataclass
+class Profile:
+    name: str
+    age: int | None = None
+
+
+async def test_json_struct_field(app, tmp_path):
+    db = muffin_peewee.Plugin(app, connection=f"aiosqlite:///{tmp_path / 'db.sqlite'}")
+
+    @db.register
+    class Test(db.Model):
+        settings = db.JSONStructField(Settings, default=Settings)
+        profile = db.JSONStructField(Profile, null=True)
+
+    assert isinstance(Test.settings, JSONStructSQLiteField)
+
+    async with db, db.connection():
+        await db.create_tables()
+        await Test.create(settings=Settings(tags=["a"]), profile=Profile("John", 42))
+        await Test.create()
+
+        first, second = await Test.select().order_by(Test.id)
+        assert first.settings == Settings(tags=["a"])
+        assert first.profile == Profile("John", 42)
+        assert second.settings == Settings()
+        assert second.profile is None
+
+        assert await Test.select().where(Test.settings["theme"] == "light").count() == 2
+
+    field = Test.profile
+    assert field.db_value(Profile("Jane")).arguments == ('{"name":"Jane","age":null}',)
+    assert field.python_value({"name": "Jane"}) == Profile("Jane")
+    with pytest.raises(ValueError, match=r"got `str` - at `\$\.age`"):
+        field.python_value('{"name": "Jane", "age": "old"}')
+
+
+def test_json_struct_like_field():
+    field = JSONStructLikeField(Profile)
+    assert field.db_value(Profile("Jane", 1)) == '{"name":"Jane","age":1}'
+    assert field.python_value('{"name":"Jane","age":1}') == Profile("Jane", 1)
+    assert field.python_value(None) is None
+
+
 async def test_uuid_field_save_and_load(
     db: Plugin, transaction: ABCTransaction, model_cls: Type[AIOModel]
 ):
@@ -0,0 +1,308 @@
+from __future__ import annotations
+
+from typing import TYPE_CHECKING
+from unittest import mock
+
+import muffin
+import peewee
+import pytest
+
+import muffin_peewee
+from muffin_peewee.instrumentation import normalize_sql
+
+if TYPE_CHECKING:
+    from muffin_peewee import QueryRecord, QueryStats
+
+
+@pytest.fixture
+def app(tmp_path):
+    return muffin.Application(
+        "peewee",
+        PEEWEE_CONNECTION=f"sqlite:///{tmp_path / 'db.sqlite'}",
+        PEEWEE_REPLICAS=[f"sqlite:///{tmp_path / 'db.sqlite'}"],
+        PEEWEE_QUERY_STATS=True,
+    )
+
+
+@pytest.fixture
+def db(app):
+    return muffin_peewee.Plugin(app)
+
+
+@pytest.fixture
+def user_cls(db):
+    class User(db.Model):
+        name = peewee.CharField()
+
+    return db.register(User)
+
+
+async def test_query_hooks(db, user_cls):
+    User = user_cls  # noqa: N806
+    records: list[QueryRecord] = []
+    db.on_query(records.append)
+
+    async with db, db.connection():
+        await db.create_tables()
+        records.clear()
+
+        await User.create(name="test")
+        await User.insert_many([{"name": "a"}, {"name": "b"}])
+        assert [user.name async for user in User.select()] == ["test", "a", "b"]
+        assert await User.get(name="test")
+        assert await User.select().count() == 3
+
+    async with db.replica():
+        assert await User.select()
+
+    create, insert, iterate, get, count, select = records
+    assert create.sql.startswith("INSERT")
+    assert create.params == ("test",)
+    assert create.rows == 1
+    assert not create.replica
+    assert create.duration > 0
+    assert insert.rows == 2
+    assert iterate.rows == 3
+    assert get.rows == 1
+    assert count.rows is None
+    assert select.rows == 3
+    assert select.replica
+
+
+async def test_query_hooks_redact_params(app):
+    db = muffin_peewee.Plugin(app, query_redact_params=True)
+    records: list[QueryRecord] = []
+    db.on_query(records.append)
+
+    async with db, db.connection():
+        await db.manager.fetchval("SELECT ?", 1)
+
+    (record,) = records
+    assert record.params is None
+
+
+async def test_query_stats(db, app, user_cls):
+    User = user_cls  # noqa: N806
+    async with db, db.connection():
+        await db.create_tables()
+
+    stats: list[tuple[str, QueryStats]] = []
+
+    @db.on_stats
+    def on_stats(request, request_stats):
+        stats.append((request.url.path, request_stats))
+
+    @app.route("/")
+    async def index(request):
+        await User.create(name="test")
+        await User.select()
+        return db.query_stats.count
+
+    client = muffin.TestClient(app)
+    async with client.lifespan():
+        response = await client.get("/")
+        assert await response.text() == "2"
+        assert response.headers["server-timing"].startswith("db;dur=")
+        assert response.headers["server-timing"].endswith(';desc="2 queries"')
+
+    ((path, request_stats),) = stats
+    assert path == "/"
+    assert request_stats.count == 2
+    assert request_stats.duration == sum(q.duration for q in request_stats.queries)
+    assert db.query_stats is None
+
+
+def test_normalize_sql():
+    assert (
+        normalize_sql(
+            "SELECT * FROM \"t1\" WHERE (\"id\" IN ($1, $2, $3)) AND name = 'a''b' LIMIT 1"
+        )
+        == 'SELECT * FROM "t1" WHERE ("id" IN (?)) AND name = ? LIMIT ?'
+    )
+    assert normalize_sql('SELECT * FROM "t1" WHERE "id" IN (?, ?)') == normalize_sql(
+        'SELECT * FROM "t1" WHERE "id" IN (%s)'
+    )
+
+
+async def test_nplusone(app):
+    db = muffin_peewee.Plugin(app, query_stats=False, nplusone_threshold=2)
+
+    @db.register
+    class User(db.Model):
+        name = peewee.CharField()
+
+    async with db, db.connection():
+        await db.create_tables()
+        await User.insert_many([{"name": "a"}, {"name": "b"}, {"name": "c"}])
+
+    @app.route("/")
+    async def index(request):
+        users = await User.select().order_by(User.id)
+        return [(await User.get_by_id(user.id)).name for user in users]
+
+    client = muffin.TestClient(app)
+    with mock.patch.object(app.logger, "warning") as warning:
+        async with client.lifespan():
+            response = await client.get("/")
+            assert await response.json() == ["a", "b", "c"]
+
+            # Only queries in the same request are counted
+            response = await client.get("/")
+            assert response.status_code == 200
+
+    assert warning.call_count == 2
+    (msg,), _ = warning.call_args
+    assert msg.startswith("N+1 queries detected (3+ times) at ")
+    assert "/test_instrumentation.py:" in msg
+
+
+async def test_nplusone_raise(app):
+    db = muffin_peewee.Plugin(app, nplusone_threshold=1, nplusone_raise=True)
+
+    @db.register
+    class User(db.Model):
+        name = peewee.CharField()
+
+    async with db, db.connection():
+        await db.create_tables()
+
+    @app.route("/")
+    async def index(request):
+        await User.get_or_none(id=1)
+        await User.get_or_none(id=2)
+        return "OK"
+
+    client = muffin.TestClient(app)
+    async with client.lifespan():
+        with mock.patch.object(app.logger, "exception") as exception:
+            response = await client.get("/")
+            assert response.status_code == 500
+
+    (exc,), _ = exception.call_args
+    assert isinstance(exc, muffin_peewee.NPlusOneError)
+    assert " in index: SELECT " in str(exc)
+
+
+@pytest.mark.parametrize("explain", [False, True])
+async def test_slow_query_log(app, explain):
+    db = muffin_peewee.Plugin(
+        app, query_stats=False, slow_query_threshold=1e-9, slow_query_explain=explain
+    )
+
+    @db.register
+    class User(db.Model):
+        name = peewee.CharField()
+
+    async with db, db.connection():
+        await db.create_tables()
+
+    @app.route("/users")
+    async def users(request):
+        return [user.name async for user in User.select().where(User.name == "a")]
+
+    client = muffin.TestClient(app)
+    with mock.patch.object(app.logger, "warning") as warning:
+        async with client.lifespan():
+            response = await client.get("/users")
+            assert response.status_code == 200
+
+    (msg, duration, route, sql, plan), _ = warning.call_args
+    assert msg.startswith("Slow query")
+    assert duration > 0
+    assert route == "GET /users"
+    assert sql.startswith("SELECT")
+    if explain:
+        assert plan.startswith("\nSCAN")
+    else:
+        assert plan == ""
+
+
+async def test_query_budget(app):
+    db = muffin_peewee.Plugin(app, query_stats=False, query_budget_queries=1)
+
+    @db.register
+    class User(db.Model):
+        name = peewee.CharField()
+
+    async with db, db.connection():
+        await db.create_tables()
+
+    @app.route("/")
+    async def index(request):
+        await User.select()
+        await User.select()
+        return "OK"
+
+    @app.route("/budget")
+    @db.policy("transaction")
+    @db.query_budget(queries=2)
+    async def budget(request):
+        await User.select()
+        await User.select()
+        return "OK"
+
+    @app.route("/unlimited")
+    @db.query_budget()
+    async def unlimited(request):
+        await User.select()
+        await User.select()
+        return "OK"
+
+    client = muffin.TestClient(app)
+    with mock.patch.object(app.logger, "warning") as warning:
+        async with client.lifespan():
+            response = await client.get("/")
+            assert response.status_code == 200
+            assert response.headers["x-query-budget-exceeded"] == "queries=2/1"
+
+            # The handler is resolved once per request
+            with mock.patch.object(app, "router", wraps=app.router) as router:
+                response = await client.get("/budget")
+            assert response.status_code == 200
+            assert "x-query-budget-exceeded" not in response.headers
+            assert router.call_count == 2  # the plugin and the application
+
+            response = await client.get("/unlimited")
+            assert response.status_code == 200
+            assert "x-query-budget-exceeded" not in response.headers
+
+    (msg,), _ = warning.call_args
+    assert msg == "Query budget exceeded by GET /: queries=2/1"
+
+
+async def test_query_budget_strict(app):
+    db = muffin_peewee.Plugin(app, query_budget_duration=1e-9, query_budget_strict=True)
+
+    @db.register
+    class User(db.Model):
+        name = peewee.CharField()
+
+    async with db, db.connection():
+        await db.create_tables()
+
+    @app.route("/")
+    async def index(request):
+        await User.select()
+        return "OK"
+
+    @app.route("/users", methods=["POST"])
+    async def create(request):
+        await User.create(name="Tom")
+        return "OK"
+
+    client = muffin.TestClient(app)
+    async with client.lifespan():
+        with mock.patch.object(app.logger, "exception") as exception:
+            response = await client.get("/")
+            assert response.status_code == 500
+
+            # The request's transaction is rolled back
+            response = await client.post("/users")
+            assert response.status_code == 500
+
+        async with db.connection():
+            assert await User.select().count() == 0
+
+    (exc,), _ = exception.call_args
+    assert isinstance(exc, muffin_peewee.QueryBudgetError)
+    assert str(exc).startswith("Query budget exceeded by POST /users: duration=")
@@ -1,3 +1,4 @@
+import asyncio
 import shutil
 from unittest import mock
 
@@ -5,6 +6,7 @@ import muffin
 import peewee
 import pytest
 from aio_databases import ReadOnlyError
+from peewee_aio.fields import AIOForeignKeyField
 
 import muffin_peewee
 
@@ -130,3 +132,546 @@ async def test_auto_transaction_disabled(tmp_path):
 
     assert response.status_code == 200
     assert await response.text() == "1"
+
+
+async def test_lazy_connection_skips_requests_without_queries(tmp_path):
+    app = muffin.Application(
+        "peewee",
+        PEEWEE_CONNECTION=f"sqlite:///{tmp_path / 'db.sqlite'}",
+        PEEWEE_LAZY_CONNECTION=True,
+    )
+    db = muffin_peewee.Plugin(app)
+
+    @db.register
+    class User(peewee.Model):
+        name = peewee.CharField()
+
+    manager = db.manager
+    async with manager, manager.connection():
+        await manager.create_tables(User)
+
+    @app.route("/health")
+    async def health(request):
+        return "OK"
+
+    @app.route("/create")
+    async def create(request):
+        await manager.save(User(name="test"))
+        return await manager.count(User.select())
+
+    client = muffin.TestClient(app)
+    async with client.lifespan():
+        with mock.patch.object(
+            manager.backend, "acquire", wraps=manager.backend.acquire
+        ) as mock_acquire:
+            response = await client.get("/health")
+            assert response.status_code == 200
+            assert mock_acquire.await_count == 0
+
+            response = await client.get("/create")
+            assert response.status_code == 200
+            assert await response.text() == "1"
+            assert mock_acquire.await_count == 1
+
+        async with manager.connection():
+            assert await manager.count(User.select()) == 1
+
+
+async def test_lazy_connection_rollbacks_on_error(tmp_path):
+    app = muffin.Application(
+        "peewee",
+        PEEWEE_CONNECTION=f"sqlite:///{tmp_path / 'db.sqlite'}",
+        PEEWEE_LAZY_CONNECTION=True,
+    )
+    db = muffin_peewee.Plugin(app)
+
+    @db.register
+    class User(peewee.Model):
+        name = peewee.CharField()
+
+    manager = db.manager
+    async with manager, manager.connection():
+        await manager.create_tables(User)
+
+    @app.route("/fail")
+    async def fail(request):
+        await manager.save(User(name="test"))
+        async with db.transaction():
+            await manager.save(User(name="nested"))
+        raise RuntimeError("fail")
+
+    client = muffin.TestClient(app)
+    async with client.lifespan():
+        response = await client.get("/fail")
+        assert response.status_code == 500
+
+        async with manager.connection():
+            assert await manager.count(User.select()) == 0
+
+
+async def test_connection_policies(tmp_path):
+    app = muffin.Application(
+        "peewee",
+        PEEWEE_CONNECTION=f"sqlite:///{tmp_path / 'db.sqlite'}",
+        PEEWEE_POLICIES={"get": "connection", "delete": "none"},
+    )
+    db = muffin_peewee.Plugin(app)
+    assert db.method_policies == {"GET": "connection", "DELETE": "none"}
+
+    @app.route("/")
+    async def index(request):
+        conn = db.manager.current_conn
+        return {
+            "connected": bool(conn and conn.is_ready),
+            "transaction": bool(conn and conn.transactions),
+        }
+
+    @app.route("/replica")
+    @db.policy("replica")
+    async def replica(request):
+        return await index(request)
+
+    @db.policy("none")
+    @app.route("/none")
+    async def none(request):
+        return await index(request)
+
+    client = muffin.TestClient(app)
+    async with client.lifespan():
+        response = await client.get("/")
+        assert await response.json() == {"connected": True, "transaction": False}
+
+        response = await client.post("/")
+        assert await response.json() == {"connected": True, "transaction": True}
+
+        response = await client.delete("/")
+        assert await response.json() == {"connected": False, "transaction": False}
+
+        response = await client.get("/none")
+        assert await response.json() == {"connected": False, "transaction": False}
+
+        # There are no replicas, fallback to the primary connection
+        response = await client.get("/replica")
+        assert await response.json() == {"connected": True, "transaction": False}
+
+
+def test_invalid_connection_policy():
+    app = muffin.Application("peewee", PEEWEE_POLICIES={"GET": "unknown"})
+    with pytest.raises(ValueError, match="Invalid connection policy"):
+        muffin_peewee.Plugin(app)
+
+    db = muffin_peewee.Plugin()
+    with pytest.raises(ValueError, match="Invalid connection policy"):
+        db.policy("unknown")  # type: ignore[arg-type]
+
+
+async def test_replica_policy(tmp_path):
+    app = muffin.Application(
+        "peewee",
+        PEEWEE_CONNECTION=f"sqlite:///{tmp_path / 'db.sqlite'}",
+        PEEWEE_REPLICAS=[f"sqlite:///{tmp_path / 'replica.sqlite'}"],
+    )
+    db = muffin_peewee.Plugin(app)
+
+    @app.route("/")
+    @db.policy("replica")
+    async def index(request):
+        assert await db.manager.fetchval("SELECT 1") == 1
+        return str(db.manager.current_conn.read_only)
+
+    client = muffin.TestClient(app)
+    async with client.lifespan():
+        response = await client.get("/")
+        assert await response.text() == "True"
+
+        db.cfg.update(lazy_connection=True)
+        app.internal_middlewares.clear()
+        app.middleware(db.get_middleware())
+        response = await client.get("/")
+        assert await response.text() == "True"
+
+
+async def test_auto_replicas(tmp_path):
+    app = muffin.Application(
+        "peewee",
+        PEEWEE_CONNECTION=f"sqlite:///{tmp_path / 'db.sqlite'}",
+        PEEWEE_REPLICAS=[f"sqlite:///{tmp_path / 'replica.sqlite'}"],
+        PEEWEE_AUTO_REPLICAS=True,
+        PEEWEE_POLICIES={"OPTIONS": "none"},
+    )
+    db = muffin_peewee.Plugin(app)
+    assert db.method_policies == {"GET": "replica", "HEAD": "replica", "OPTIONS": "none"}
+
+    @app.route("/")
+    async def index(request):
+        conn = db.manager.current_conn
+        return str(conn and conn.read_only)
+
+    @app.route("/primary")
+    @db.policy("connection")
+    async def primary(request):
+        return await index(request)
+
+    client = muffin.TestClient(app)
+    async with client.lifespan():
+        response = await client.get("/")
+        assert await response.text() == "True"
+
+        response = await client.post("/")
+        assert await response.text() == "False"
+
+        response = await client.options("/")
+        assert await response.text() == "None"
+
+        response = await client.get("/primary")
+        assert await response.text() == "False"
+
+
+async def test_replicas_sticky(tmp_path):
+    app = muffin.Application(
+        "peewee",
+        PEEWEE_CONNECTION=f"sqlite:///{tmp_path / 'db.sqlite'}",
+        PEEWEE_REPLICAS=[f"sqlite:///{tmp_path / 'replica.sqlite'}"],
+        PEEWEE_AUTO_REPLICAS=True,
+        PEEWEE_REPLICAS_STICKY=5,
+    )
+    db = muffin_peewee.Plugin(app)
+
+    @app.route("/")
+    async def index(request):
+        return str(db.manager.current_conn.read_only)
+
+    client = muffin.TestClient(app)
+    async with client.lifespan():
+        response = await client.get("/")
+        assert await response.text() == "True"
+        assert "peewee-primary" not in response.cookies
+
+        response = await client.post("/")
+        assert await response.text() == "False"
+        assert "peewee-primary" in response.cookies
+
+        # The client is pinned to the primary
+        response = await client.get("/")
+        assert await response.text() == "False"
+
+        client.cookies.clear()
+        response = await client.get("/")
+        assert await response.text() == "True"
+
+        client.cookies["peewee-primary"] = "invalid"
+        response = await client.get("/")
+        assert await response.text() == "True"
+
+
+async def test_shutdown_drains_connections(tmp_path):
+    app = muffin.Application(
+        "peewee",
+        PEEWEE_CONNECTION=f"sqlite:///{tmp_path / 'db.sqlite'}",
+        PEEWEE_DRAIN_TIMEOUT=0.1,
+    )
+    db = muffin_peewee.Plugin(app)
+    manager = db.manager
+
+    await db.startup()
+    release = asyncio.Event()
+
+    async def query():
+        async with db.connection(), db.transaction():
+            await release.wait()
+            return await manager.fetchval("SELECT 1")
+
+    task = asyncio.create_task(query())
+    await asyncio.sleep(0)
+    assert len(manager.active) == 1
+
+    drain = asyncio.create_task(manager.drain(1))
+    await asyncio.sleep(0)
+    assert manager.draining
+
+    with pytest.raises(RuntimeError, match="draining"):
+        async with db.connection():
+            pass
+
+    release.set()
+    assert await task == 1
+    assert await drain == 0
+    await manager.disconnect()
+
+    # Force close connections after the timeout
+    await db.startup()
+    assert not manager.draining
+
+    # Lazy connections are registered when they are acquired
+    idle = db.lazy_connection()
+    await idle.__aenter__()
+    assert not manager.active
+
+    lazy = db.lazy_connection()
+    await lazy.__aenter__()
+    await lazy.start()
+    assert len(manager.active) == 1
+
+    with mock.patch.object(app.logger, "warning") as warning:
+        await db.shutdown()
+
+    assert not manager.active
+    warning.assert_called_once_with("Database drain: %d connections were force-closed", 1)
+
+
+async def test_drain_rolls_back_transactions(tmp_path):
+    app = muffin.Application("peewee", PEEWEE_CONNECTION=f"sqlite:///{tmp_path / 'db.sqlite'}")
+    db = muffin_peewee.Plugin(app)
+    manager = db.manager
+
+    @db.register
+    class Item(db.Model):
+        num = peewee.IntegerField()
+
+    await db.startup()
+    async with db.connection():
+        await db.create_tables()
+
+    lazy = db.lazy_connection(transaction=True)
+    await lazy.__aenter__()
+    await Item.create(num=1)
+    savepoint = lazy.conn.transaction()
+    await savepoint.start()
+    await Item.create(num=2)
+
+    assert await manager.drain(0) == 1
+    await manager.disconnect()
+
+    await manager.connect()
+    async with manager.connection(create=True):
+        assert await Item.select().count() == 0
+
+    await lazy.__aexit__(None, None, None)
+    await db.shutdown()
+
+
+async def test_middleware_rejects_requests_while_draining(tmp_path):
+    app = muffin.Application("peewee", PEEWEE_CONNECTION=f"sqlite:///{tmp_path / 'db.sqlite'}")
+    db = muffin_peewee.Plugin(app)
+
+    @app.route("/")
+    async def index(request):
+        return "OK"
+
+    client = muffin.TestClient(app)
+    async with client.lifespan():
+        db.manager.draining = True
+        response = await client.get("/")
+        assert response.status_code == 503
+
+
+async def test_stream_query(tmp_path):
+    app = muffin.Application(
+        "peewee",
+        PEEWEE_CONNECTION=f"sqlite:///{tmp_path / 'db.sqlite'}",
+        PEEWEE_QUERY_STATS=True,
+    )
+    db = muffin_peewee.Plugin(app)
+
+    @db.register
+    class User(db.Model):
+        name = peewee.CharField()
+        meta = db.JSONField(default={})
+
+    async with db.manager, db.connection():
+        await User.create_table()
+        await db.bulk_load(User, [("Tom", {"age": 1}), ("Ann", {})])
+
+    connections = []
+
+    @app.route("/users.{format}")
+    async def users(request):
+        connections.append(db.manager.current_conn)
+        query = User.select(User.name, User.meta).order_by(User.id)
+        return db.stream(query, format=request.path_params["format"], batch_size=1)
+
+    client = muffin.TestClient(app)
+    async with client.lifespan():
+        res = await client.get("/users.ndjson")
+        assert res.status_code == 200
+        assert res.headers["content-type"] == "application/x-ndjson"
+        assert await res.text() == '{"name":"Tom","meta":{"age":1}}\n{"name":"Ann","meta":{}}\n'
+
+        res = await client.get("/users.json")
+        assert res.headers["content-type"] == "application/json"
+        assert await res.json() == [
+            {"name": "Tom", "meta": {"age": 1}},
+            {"name": "Ann", "meta": {}},
+        ]
+
+        res = await client.get("/users.csv")
+        assert res.headers["content-type"] == "text/csv; charset=utf-8"
+        assert await res.text() == "name,meta\r\nTom,{'age': 1}\r\nAnn,{}\r\n"
+
+        # The connections are released after the responses are sent
+        assert all(not conn.is_ready for conn in connections)
+        assert not db.manager.active
+
+    # Dropped responses don't hold connections
+    db.on_stats(mock.Mock(side_effect=RuntimeError))
+    async with client.lifespan():
+        with mock.patch.object(app.logger, "exception"):
+            res = await client.get("/users.ndjson")
+        assert res.status_code == 500
+        assert not db.manager.active
+
+    async with db.manager, db.connection():
+        await User.delete()
+        res = db.stream(User.select(), format="json")
+        assert "".join([chunk async for chunk in res.stream]) == "[]"
+
+    with pytest.raises(ValueError, match="Unsupported stream format"):
+        db.stream(User.select(), format="xml")  # type: ignore[arg-type]
+
+
+async def test_identity_map(tmp_path):
+    app = muffin.Application(
+        "peewee",
+        PEEWEE_CONNECTION=f"sqlite:///{tmp_path / 'db.sqlite'}",
+        PEEWEE_IDENTITY_MAP=True,
+    )
+    db = muffin_peewee.Plugin(app)
+
+    @db.register
+    class User(db.Model):
+        name = peewee.CharField()
+
+    @db.register
+    class Post(db.Model):
+        author = AIOForeignKeyField(User)
+
+    async with db.manager, db.connection():
+        await db.manager.create_tables(User, Post)
+        user = await User.create(name="Tom")
+        await Post.create(author=user)
+        await Post.create(author=user)
+
+    queries = []
+    db.on_query(queries.append)
+
+    @app.route("/")
+    async def index(request):
+        user = await User.get_by_id(1)
+        posts = await Post.select().order_by(Post.id)
+        authors = [await post.author for post in posts]
+        assert all(author is user for author in authors)
+        assert await User.get(id=1) is user
+        assert db.manager.current_conn
+
+        # Invalidate on save
+        user.name = "Tim"
+        await user.save()
+        assert await User.get_by_id(1) is not user
+        return "ok"
+
+    client = muffin.TestClient(app)
+    async with client.lifespan():
+        res = await client.get("/")
+        assert res.status_code == 200
+
+    assert [query.sql.split()[0] for query in queries] == ["SELECT", "SELECT", "UPDATE", "SELECT"]
+
+    # Outside requests
+    async with db.manager, db.connection():
+        assert await User.get_by_id(1) is not await User.get_by_id(1)
+
+        with db.identity_map() as identity:
+            user = await User.get_by_id(1)
+            assert await User.get_by_id(1) is user
+            assert len(identity) == 1
+
+            await User.delete().where(User.name == "Tim")
+            assert not identity
+            assert await User.get_or_none(id=1) is None
+
+            # Upserts and raw writes
+            user = await User.get_by_id((await User.create(name="Tom")).id)
+            assert await User.get_by_id(user.id) is user
+            await User.insert(id=user.id, name="Tim").on_conflict_ignore()
+            assert await User.get_by_id(user.id) is user
+
+            await User.insert(id=user.id, name="Tim").on_conflict(
+                conflict_target=[User.id], preserve=[User.name]
+            )
+            tim = await User.get_by_id(user.id)
+            assert tim is not user
+            assert tim.name == "Tim"
+
+            await db.manager.execute("UPDATE user SET name = 'Ann'")
+            assert not identity
+            assert (await User.get_by_id(user.id)).name == "Ann"
+
+            rename = db.compiled(lambda name: User.update(name=name))
+            await rename("Bob")
+            assert not identity
+            assert (await User.get_by_id(user.id)).name == "Bob"
+
+
+async def test_relation_loader(tmp_path):
+    app = muffin.Application(
+        "peewee",
+        PEEWEE_CONNECTION=f"sqlite:///{tmp_path / 'db.sqlite'}",
+        PEEWEE_RELATION_LOADER=True,
+        PEEWEE_IDENTITY_MAP=True,
+    )
+    db = muffin_peewee.Plugin(app)
+
+    @db.register
+    class User(db.Model):
+        name = peewee.CharField()
+
+    @db.register
+    class Post(db.Model):
+        author = AIOForeignKeyField(User)
+
+    async with db.manager, db.connection():
+        await db.manager.create_tables(User, Post)
+        users = [await User.create(name=name) for name in ("Tom", "Ann", "Bob")]
+        for user in (*users, users[0]):
+            await Post.create(author=user)
+
+    queries = []
+    db.on_query(queries.append)
+
+    @app.route("/")
+    async def index(request):
+        posts = await Post.select().order_by(Post.id)
+        authors = await asyncio.gather(*(post.author for post in posts))
+        assert [author.name for author in authors] == ["Tom", "Ann", "Bob", "Tom"]
+        assert authors[0] is authors[3]
+
+        users = await User.select().order_by(User.id)
+        users_posts = await asyncio.gather(*(db.load_many(Post.author, user) for user in users))
+        assert [[post.id for post in user_posts] for user_posts in users_posts] == [
+            [1, 4],
+            [2],
+            [3],
+        ]
+        return "ok"
+
+    client = muffin.TestClient(app)
+    async with client.lifespan():
+        res = await client.get("/")
+        assert res.status_code == 200
+
+    assert len(queries) == 4
+    assert " IN " in queries[1].sql
+    assert " IN " in queries[3].sql
+
+    # Without the loader
+    async with db.manager, db.connection():
+        assert (await db.load(User.name, "Ann")).id == 2
+        assert len(await db.load_many(Post.author, 1)) == 2
+
+        with db.relation_loader():
+            tom, missing = await asyncio.gather(db.load(User.id, 1), db.load(User.id, 10))
+            assert tom.name == "Tom"
+            assert missing is None
+
+            with pytest.raises(User.DoesNotExist):
+                await User.get_by_id(10)
@@ -0,0 +1,78 @@
+from __future__ import annotations
+
+import datetime as dt
+from typing import TYPE_CHECKING
+
+import peewee
+import pytest
+
+if TYPE_CHECKING:
+    from aio_databases.backends import ABCTransaction
+    from peewee_aio import AIOModel
+
+    from muffin_peewee import Plugin
+
+
+async def test_paginate(db: Plugin, transaction: ABCTransaction, model_cls: type[AIOModel]):
+    @db.register
+    class Item(model_cls):  # type: ignore[valid-type,misc]
+        name = peewee.CharField()
+        rank = peewee.IntegerField()
+        created = peewee.DateTimeField()
+
+    await Item.create_table()
+
+    start = dt.datetime(2024, 1, 1)  # noqa: DTZ001
+    await db.bulk_load(
+        Item,
+        [(f"item-{idx}", idx % 3, start + dt.timedelta(hours=idx // 2)) for idx in range(10)],
+    )
+
+    async def collect(order_by, limit=3):
+        pages, after = [], None
+        while True:
+            page = await db.paginate(Item.select(), order_by=order_by, after=after, limit=limit)
+            pages.append([item.name for item in page.items])
+            if page.next is None:
+                return pages, page
+
+            after = page.next
+
+    # Forward by a non-unique field (the primary key is added)
+    pages, last = await collect([Item.created.desc()])
+    assert pages == [
+        ["item-9", "item-8", "item-7"],
+        ["item-6", "item-5", "item-4"],
+        ["item-3", "item-2", "item-1"],
+        ["item-0"],
+    ]
+
+    # Backward
+    page = await db.paginate(
+        Item.select(), order_by=[Item.created.desc()], before=last.prev, limit=3
+    )
+    assert [item.name for item in page.items] == ["item-3", "item-2", "item-1"]
+    assert page.prev
+    assert page.next
+
+    page = await db.paginate(
+        Item.select(), order_by=[Item.created.desc()], before=page.prev, limit=6
+    )
+    assert [item.name for item in page.items] == [f"item-{idx}" for idx in range(9, 3, -1)]
+    assert page.prev is None
+
+    # Mixed directions
+    pages, _ = await collect([Item.rank, Item.name.desc()], limit=4)
+    assert pages == [
+        ["item-9", "item-6", "item-3", "item-0"],
+        ["item-7", "item-4", "item-1", "item-8"],
+        ["item-5", "item-2"],
+    ]
+
+    page = await db.paginate(Item.select().where(Item.rank == 5), order_by=[Item.id])
+    assert page == ([], None, None)
+
+    with pytest.raises(ValueError, match="Invalid cursor"):
+        await db.paginate(Item.select(), order_by=[Item.id], after="invalid")
+
+    await Item.drop_table()
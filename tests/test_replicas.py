@@ -0,0 +1,100 @@
+import asyncio
+from unittest import mock
+
+import muffin
+import pytest
+
+import muffin_peewee
+
+
+@pytest.fixture
+def app(tmp_path):
+    return muffin.Application(
+        "peewee",
+        PEEWEE_CONNECTION=f"sqlite:///{tmp_path / 'db.sqlite'}",
+        PEEWEE_REPLICAS=[
+            f"sqlite:///{tmp_path / 'replica1.sqlite'}",
+            f"sqlite:///{tmp_path / 'replica2.sqlite'}",
+        ],
+    )
+
+
+async def test_replicas_weights(app):
+    db = muffin_peewee.Plugin(app, replicas_weights=[0, 1])
+    _, replica2 = db.manager.replica_backends
+
+    for _ in range(10):
+        assert db.manager.get_replica_backend() is replica2
+
+    async with db.replica() as conn:
+        assert conn.backend is replica2
+        assert conn.read_only
+
+
+async def test_replicas_zero_weights(app):
+    db = muffin_peewee.Plugin(app, replicas_weights=[0, 0])
+    assert db.manager.get_replica_backend() in db.manager.replica_backends
+
+
+def test_replicas_weights_invalid(app):
+    with pytest.raises(ValueError, match="weights"):
+        muffin_peewee.Plugin(app, replicas_weights=[1])
+
+
+async def test_replicas_health_check(app):
+    db = muffin_peewee.Plugin(app, replicas_max_lag=1)
+    balancer = db.manager.balancer
+    replica1, replica2 = balancer.replicas
+
+    await balancer.check_all()
+    assert replica1.healthy
+    assert replica2.healthy
+    assert replica1.latency is not None
+    assert replica1.lag is None  # SQLite doesn't report lag
+
+    with mock.patch.object(replica1.backend, "_acquire", side_effect=OSError):
+        await balancer.check_all()
+
+    assert not replica1.healthy
+    assert replica2.healthy
+    assert db.manager.get_replica_backend() is replica2.backend
+
+    # Exclude lagging replicas
+    with mock.patch.dict("muffin_peewee.replicas.LAG_QUERIES", sqlite="SELECT 5"):
+        await balancer.check(replica2)
+
+    assert replica2.lag == 5
+    assert not replica2.healthy
+
+    # Fallback to the primary in read-only mode
+    assert db.manager.get_replica_backend() is db.manager.backend
+    async with db.replica() as conn:
+        assert conn.read_only
+        assert conn.backend is db.manager.backend
+
+    # Exclude hanging replicas
+    balancer.timeout = 0.1
+    await balancer.check(replica1)
+    assert replica1.healthy
+
+    async def hang():
+        await asyncio.sleep(1)
+
+    with mock.patch.object(replica1.backend, "_acquire", side_effect=hang):
+        await asyncio.wait_for(balancer.check_all(), 0.5)
+
+    assert not replica1.healthy
+
+
+async def test_replicas_health_monitor(app):
+    db = muffin_peewee.Plugin(app, replicas_health_interval=10)
+    balancer = db.manager.balancer
+
+    with mock.patch.object(balancer, "check_all") as check_all:
+        async with app.lifespan:
+            assert balancer.task
+            await asyncio.sleep(0)
+
+        assert check_all.await_count == 1
+
+    assert balancer.task is None
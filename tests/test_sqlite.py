@@ -1,10 +1,14 @@
 from __future__ import annotations
 
+import asyncio
 from typing import TYPE_CHECKING
 
+import muffin
+import peewee as pw
 import pytest
 
 import muffin_peewee
+from muffin_peewee.sqlite import SQLiteReaderBackend, SQLiteWriterBackend
 
 if TYPE_CHECKING:
     from muffin import Application
@@ -23,3 +27,98 @@ async def db(app: Application) -> Plugin:
 
 async def test_sqlite_backend_name(db):
     assert db.manager.backend.name == "aiosqlite"
+
+
+async def test_sqlite_writer(app: Application, tmp_path):
+    db = muffin_peewee.Plugin(
+        app,
+        connection=f"aiosqlite:///{tmp_path / 'db.sqlite'}",
+        sqlite_writer=True,
+        sqlite_readers=2,
+    )
+    manager = db.manager
+    writer = manager.backend
+    (readers,) = manager.replica_backends
+    assert isinstance(writer, SQLiteWriterBackend)
+    assert isinstance(readers, SQLiteReaderBackend)
+    assert db.method_policies["GET"] == "replica"
+
+    @db.register
+    class Item(db.Model):
+        num = pw.IntegerField()
+
+    async with db:
+        await db.create_tables()
+
+        async def write(num: int):
+            async with db.transaction(create=True):
+                await Item.create(num=num)
+                await asyncio.sleep(0)
+                await Item.update(num=Item.num + 1).where(Item.num == num)
+
+        await asyncio.gather(*(write(num * 10) for num in range(10)))
+
+        async def read():
+            async with db.replica():
+                await asyncio.sleep(0)
+                return await Item.select().count()
+
+        assert await asyncio.gather(*(read() for _ in range(5))) == [10] * 5
+        assert readers.opened == 2
+
+        async with db.replica():
+            with pytest.raises(Exception, match="read"):
+                await Item.create(num=0)
+
+    assert writer.conn is None
+    assert readers.opened == 0
+
+
+async def test_sqlite_writer_deadlocks(app: Application, tmp_path):
+    db = muffin_peewee.Plugin(
+        app,
+        connection=f"aiosqlite:///{tmp_path / 'db.sqlite'}",
+        sqlite_writer=True,
+        sqlite_readers=2,
+        warmup_connections=5,
+    )
+    (readers,) = db.manager.replica_backends
+
+    await asyncio.wait_for(db.startup(), 1)
+    assert readers.opened == 2
+
+    @db.register
+    class Item(db.Model):
+        num = pw.IntegerField()
+
+    @app.route("/items", methods=["POST"])
+    async def create(request):
+        item = await Item.create(num=1)
+        return item.id
+
+    client = muffin.TestClient(app)
+
+    # The nested contexts share the writer's connection (e.g. a request in a test)
+    async with db.connection() as conn:
+        await db.create_tables()
+        async with db.connection() as nested, db.transaction(create=True):
+            assert nested is conn
+            await Item.create(num=0)
+
+        response = await asyncio.wait_for(client.post("/items"), 1)
+        assert response.status_code == 200
+
+        db.cfg.update(lazy_connection=True)
+        response = await asyncio.wait_for(client.post("/items"), 1)
+        assert response.status_code == 200
+        assert await Item.select().count() == 3
+
+        with pytest.raises(RuntimeError, match="already acquired"):
+            await db.manager.backend.acquire()
+
+    await db.shutdown()
+
+
+def test_sqlite_writer_invalid(app: Application):
+    with pytest.raises(ValueError, match="database file"):
+        muffin_peewee.Plugin(app, connection="aiosqlite:///:memory:", sqlite_writer=True)